@@ -0,0 +1,226 @@
+import os
+import json
+import random
+import threading
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+
+class RequestRejected(Exception):
+    """
+    Sentinel Hub refused a request as invalid or forbidden (400/403), e.g. a bad
+    evalscript or an exhausted quota. Says nothing about the collection's data,
+    and every other request would be refused too, so fetching stops.
+    """
+
+class CollectionStats:
+    def __init__(self, path, prior_weight=None, skip_rate=None, skip_min_attempts=None, explore_rate=None, save_every=20):
+        """
+        Persistent success counts of each data collection per section and
+        period (YYYY-MM), used to try the collection most likely to return a
+        valid image first and to skip collections that keep failing.
+        Stored as {"<section_id>|<period>": {"<collection>": [successes, attempts]}}.
+        """
+        self.path = path
+        self.prior_weight = settings.COLLECTION_PRIOR_WEIGHT if prior_weight is None else prior_weight
+        self.skip_rate = settings.COLLECTION_SKIP_RATE if skip_rate is None else skip_rate
+        self.skip_min_attempts = settings.COLLECTION_SKIP_MIN_ATTEMPTS if skip_min_attempts is None else skip_min_attempts
+        self.explore_rate = settings.COLLECTION_EXPLORE_RATE if explore_rate is None else explore_rate
+        self.save_every = save_every
+        self.counts = self._load()
+        # Counts summed per scope (all, section, period) so estimates need no scan of counts
+        self.totals = self._totals(self.counts)
+        # Counts recorded since the last save, merged into the file on save
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable collection stats {self.path}: {str(e)}")
+            return {}
+
+    @staticmethod
+    def _key(section_id, date):
+        return f"{section_id}|{date[:7]}"
+
+    @staticmethod
+    def _scopes(key):
+        """Aggregate keys a cell key counts towards: all cells, its section and its period"""
+        section_id, period = key.rsplit("|", 1)
+        return ("*", f"{section_id}|*", f"*|{period}")
+
+    @classmethod
+    def _totals(cls, counts):
+        totals = {}
+        for key, collections in counts.items():
+            for scope in cls._scopes(key):
+                for collection, (successes, attempts) in collections.items():
+                    cls._add(totals, scope, collection, successes, attempts)
+        return totals
+
+    @staticmethod
+    def _add(counts, key, collection, successes, attempts):
+        entry = counts.setdefault(key, {}).setdefault(collection, [0, 0])
+        entry[0] += successes
+        entry[1] += attempts
+
+    def record(self, section_id, date, collection, success):
+        """Count one request outcome; thread-safe so hedged requests can report concurrently"""
+        key = self._key(section_id, date)
+        with self._lock:
+            self._add(self.counts, key, collection, int(success), 1)
+            for scope in self._scopes(key):
+                self._add(self.totals, scope, collection, int(success), 1)
+            self._add(self._pending, key, collection, int(success), 1)
+            unsaved = sum(attempts for entry in self._pending.values() for _, attempts in entry.values())
+        if unsaved >= self.save_every:
+            self.save()
+
+    def success_rate(self, section_id, date, collection):
+        """
+        Smoothed success rate of a collection for a section and period.
+        Sparse counts are pulled towards the rate of the same period across all
+        sections and of the same section across all periods, which in turn are
+        pulled towards the collection's overall rate.
+        """
+        return self._estimate(section_id, date, collection)[0]
+
+    def _estimate(self, section_id, date, collection):
+        """Smoothed rate plus the number of attempts made for this section or period"""
+        cell = self._key(section_id, date)
+        all_key, section_key, period_key = self._scopes(cell)
+
+        with self._lock:
+            totals = {
+                scope: list(counts.get(key, {}).get(collection, (0, 0)))
+                for scope, counts, key in (("all", self.totals, all_key), ("section", self.totals, section_key),
+                                           ("period", self.totals, period_key), ("cell", self.counts, cell))
+            }
+
+        def smooth(counts, prior):
+            return (counts[0] + self.prior_weight * prior) / (counts[1] + self.prior_weight)
+
+        overall = smooth(totals["all"], 0.5)
+        prior = (smooth(totals["section"], overall) + smooth(totals["period"], overall)) / 2
+        local_attempts = totals["section"][1] + totals["period"][1] - totals["cell"][1]
+        return smooth(totals["cell"], prior), local_attempts
+
+    def order(self, section_id, date, collections, explore=True):
+        """
+        Candidate collections (dicts with an "id") sorted by smoothed success rate,
+        ties keeping the configured order. Collections below skip_rate after at least
+        skip_min_attempts tries for the same section or period are dropped, except on
+        a small random share of requests so their rate can recover, and never all of them.
+        """
+        estimates = [self._estimate(section_id, date, c["id"]) for c in collections]
+        rates = [rate for rate, _ in estimates]
+        # sorted() is stable, so equal rates keep the configured order
+        ranked = sorted(range(len(collections)), key=lambda i: -rates[i])
+        if explore and random.random() < self.explore_rate:
+            return [collections[i] for i in ranked]
+
+        kept = [i for i in ranked if rates[i] >= self.skip_rate or estimates[i][1] < self.skip_min_attempts]
+        return [collections[i] for i in kept or ranked[:1]]
+
+    def save(self):
+        """Merge the counts recorded since the last save into the file, so several workers can share it"""
+        with self._save_lock:
+            self._save()
+
+    def _save(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        counts = self._load()
+        for key, collections in pending.items():
+            for collection, (successes, attempts) in collections.items():
+                self._add(counts, key, collection, successes, attempts)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(counts, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+        with self._lock:
+            # Keep counts recorded while saving on top of the merged file
+            for key, collections in self._pending.items():
+                for collection, (successes, attempts) in collections.items():
+                    self._add(counts, key, collection, successes, attempts)
+            self.counts = counts
+            self.totals = self._totals(counts)
+
+class EmptyDates:
+    def __init__(self, path, retry_days=None):
+        """
+        Section dates for which every collection was tried and failed its quality
+        check, over a window that had already ended, so fetch plans stop spending
+        processing units on them. Stored as {"<section_id>": {"<date>": "<recorded on>"}}
+        and merged on save like CollectionStats. Entries expire after retry_days, in
+        case the archive was filled in later; delete the file to retry them all now.
+        """
+        self.path = path
+        self.retry_days = settings.EMPTY_DATES_RETRY_DAYS if retry_days is None else retry_days
+        self.dates = self._load()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable empty dates {self.path}: {str(e)}")
+            return {}
+        # Lists come from files without recording dates, whose entries may stem from HTTP errors; retry them
+        return {section_id: dict(dates) for section_id, dates in data.items() if isinstance(dates, dict)}
+
+    @staticmethod
+    def _merge(dates, added):
+        for section_id, recorded in added.items():
+            section_dates = dates.setdefault(section_id, {})
+            for date, recorded_on in recorded.items():
+                section_dates[date] = max(recorded_on, section_dates.get(date, recorded_on))
+
+    def add(self, section_id, date, recorded_on=None):
+        recorded_on = recorded_on or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            self._merge(self.dates, {section_id: {date: recorded_on}})
+            self._merge(self._pending, {section_id: {date: recorded_on}})
+
+    def for_section(self, section_id):
+        """Empty dates of a section that have not expired yet"""
+        cutoff = (datetime.now() - timedelta(days=self.retry_days)).strftime("%Y-%m-%d")
+        with self._lock:
+            return {date for date, recorded_on in self.dates.get(section_id, {}).items() if recorded_on > cutoff}
+
+    def save(self):
+        """Merge the dates added since the last save into the file"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            dates = self._load()
+            self._merge(dates, pending)
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(dates, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._merge(self.dates, dates)
@@ -0,0 +1,142 @@
+import io
+import os
+import queue
+import threading
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+
+# File extension used for each storage codec ("original" keeps the server's encoding)
+CODEC_EXTENSIONS = {
+    "original": settings.IMAGE_FORMAT,
+    "png": "png",
+    "webp": "webp"
+}
+
+def storage_extension(codec=None):
+    """Extension of stored images for the given (or configured) codec"""
+    return CODEC_EXTENSIONS[codec or settings.IMAGE_STORAGE_CODEC]
+
+def encode_image(image_data, codec=None, level=None):
+    """
+    Re-encode an image payload for storage.
+    png produces an optimized PNG at the given compression level (0-9),
+    webp a lossless WebP where level is the compression effort (0-100).
+    Without a level, each codec uses its own setting.
+    """
+    codec = codec or settings.IMAGE_STORAGE_CODEC
+    if codec == "original":
+        return image_data
+
+    with Image.open(io.BytesIO(image_data)) as img:
+        img.load()
+        buffer = io.BytesIO()
+        if codec == "png":
+            level = settings.IMAGE_STORAGE_LEVEL if level is None else level
+            img.save(buffer, format="PNG", optimize=True, compress_level=min(level, 9))
+        elif codec == "webp":
+            level = settings.IMAGE_STORAGE_WEBP_EFFORT if level is None else level
+            img.save(buffer, format="WEBP", lossless=True, quality=level, method=6)
+        else:
+            raise ValueError(f"Unsupported storage codec: {codec}")
+    return buffer.getvalue()
+
+def write_atomic(path, data):
+    """Write a file via a temporary file and rename, so readers never see a partial image"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class WriteBehindWriter:
+    def __init__(self, num_writers=None, max_queue=None, codec=None, level=None):
+        """
+        Persist fetched payloads on dedicated writer threads.
+        Network code hands over payloads with submit() and moves on; the bounded
+        queue only blocks it when the writers fall max_queue payloads behind.
+        """
+        self.codec = codec or settings.IMAGE_STORAGE_CODEC
+        # None lets encode_image pick the level configured for the codec
+        self.level = level
+        self.queue = queue.Queue(maxsize=max_queue or settings.WRITER_QUEUE_SIZE)
+        self.written = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # (local_path, error) of writes that failed since the last flush()
+        self.failures = []
+        self._lock = threading.Lock()
+        self._threads = []
+
+        for i in range(num_writers or settings.WRITER_THREADS):
+            thread = threading.Thread(target=self._run, name=f"image-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, image_data, local_path, on_saved=None, codec=None, on_failed=None):
+        """
+        Queue a payload for writing; on_saved() runs once the file is on disk,
+        on_failed(error) if encoding or writing it failed.
+        codec overrides the writer's storage codec for this payload.
+        """
+        self.queue.put((image_data, local_path, on_saved, codec, on_failed))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                image_data, local_path, on_saved, codec, on_failed = item
+                encoded = encode_image(image_data, codec or self.codec, self.level)
+                write_atomic(local_path, encoded)
+                with self._lock:
+                    self.written += 1
+                    self.bytes_in += len(image_data)
+                    self.bytes_out += len(encoded)
+                print(f"Image saved to {local_path}")
+                if on_saved:
+                    on_saved()
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                    self.failures.append((item[1], e))
+                print(f"Error writing {item[1]}: {str(e)}")
+                if item[4]:
+                    try:
+                        item[4](e)
+                    except Exception as callback_error:
+                        print(f"Error reporting failed write of {item[1]}: {str(callback_error)}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        Block until every queued payload has been handled and return the
+        (local_path, error) pairs of the writes that failed since the last flush.
+        """
+        self.queue.join()
+        with self._lock:
+            failures, self.failures = self.failures, []
+        return failures
+
+    def close(self):
+        """Write everything still queued and stop the writer threads"""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self.written:
+            print(f"Writer stored {self.written} images ({self.bytes_in / 1e6:.1f} MB received, {self.bytes_out / 1e6:.1f} MB on disk, {self.failed} failed)")
@@ -0,0 +1,194 @@
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.api.job_queue import section_location
+from src.api.collection_stats import CollectionStats, EmptyDates
+from src.processing.state import ProcessingState
+from src.processing.spectral import bands_dir
+from src.utils.geo_helpers import calculate_distances
+from src.utils.image_io import list_section_images
+
+# Sentinel Hub counts the output area in units of 512x512 pixels and the input in units of 3 bands
+PU_AREA_UNIT = 512 * 512
+PU_MINIMUM = 0.01
+
+def evalscript_input_bands(evalscript):
+    """Number of input bands requested by an evalscript; dataMask is not billed"""
+    match = re.search(r"bands\s*:\s*\[([^\]]*)\]", evalscript)
+    if not match:
+        return 3
+    bands = [band.strip().strip("\"'") for band in match.group(1).split(",") if band.strip()]
+    return len([band for band in bands if band != "dataMask"]) or 1
+
+def estimate_processing_units(width=None, height=None, evalscript=None):
+    """
+    Processing units charged for one request: output pixels in 512x512 units,
+    times input bands / 3, with FLOAT32 output counting double.
+    """
+    width = width or settings.IMAGE_WIDTH
+    height = height or settings.IMAGE_HEIGHT
+    evalscript = evalscript or (settings.SPECTRAL_EVALSCRIPT if settings.SPECTRAL_BANDS else settings.EVALSCRIPT)
+    units = width * height / PU_AREA_UNIT * evalscript_input_bands(evalscript) / 3
+    if "FLOAT32" in evalscript:
+        units *= 2
+    return max(PU_MINIMUM, units)
+
+def estimate_request_bytes(images_dir, width=None, height=None):
+    """
+    Bytes returned per successful request: the median size of the images
+    already stored, or an estimate from the output dimensions if there are none.
+    """
+    width = width or settings.IMAGE_WIDTH
+    height = height or settings.IMAGE_HEIGHT
+    sizes = []
+    if os.path.isdir(images_dir):
+        for section_id in os.listdir(images_dir):
+            for _, path in list_section_images(os.path.join(images_dir, section_id)):
+                sizes.append(os.path.getsize(path))
+    if sizes:
+        estimate = sorted(sizes)[len(sizes) // 2]
+    else:
+        estimate = int(width * height * 3 * settings.PLAN_BYTES_PER_PIXEL)
+    if settings.SPECTRAL_BANDS:
+        # The band image has four 8-bit channels instead of three
+        estimate = int(estimate * 7 / 3)
+    return estimate
+
+def ground_resolution(bbox, width=None, height=None):
+    """Approximate (x, y) ground resolution in metres per pixel of a [min_lon, min_lat, max_lon, max_lat] bbox"""
+    width = width or settings.IMAGE_WIDTH
+    height = height or settings.IMAGE_HEIGHT
+    min_lon, min_lat, max_lon, max_lat = bbox
+    mid_lat = (min_lat + max_lat) / 2
+    x_km = calculate_distances(mid_lat, min_lon, mid_lat, max_lon)
+    y_km = calculate_distances(min_lat, min_lon, max_lat, min_lon)
+    return float(x_km) * 1000 / width, float(y_km) * 1000 / height
+
+def recent_change(processed_dir, section_id, lookback=None):
+    """Largest changed fraction among the last processed dates of a section, 0 if unknown"""
+    lookback = lookback or settings.PLAN_CHANGE_LOOKBACK
+    state = ProcessingState(processed_dir, section_id)
+    dates = sorted(state.dates)[-lookback:]
+    return max([state.dates[date].get("result", {}).get("changed_fraction", 0.0) for date in dates] or [0.0])
+
+def plan_fetch(sections, dates, images_dir, processed_dir, collections, collection_stats=None, empty_dates=None):
+    """
+    Enumerate the section x date x collection plan for everything not stored yet
+    and not known to have no valid image (empty_dates).
+    Each item carries the collections in the order they will be tried, the
+    expected number of requests, processing units and bytes, and a priority.
+    Items are returned in priority order: newer dates first, decaying with
+    PLAN_RECENCY_HALF_LIFE_WEEKS, boosted for sections with recent change.
+    """
+    request_units = estimate_processing_units()
+    request_bytes = estimate_request_bytes(images_dir)
+    newest = datetime.strptime(max(dates), "%Y-%m-%d") if dates else None
+
+    changes = {section["id"]: recent_change(processed_dir, section["id"]) for section in sections}
+    max_change = max(changes.values(), default=0.0) or 1.0
+
+    plan = []
+    for section in sections:
+        stored = {date for date, _ in list_section_images(os.path.join(images_dir, section["id"]))}
+        if settings.SPECTRAL_BANDS:
+            # Dates stored before bands were requested are fetched again
+            stored &= {date for date, _ in list_section_images(bands_dir(images_dir, section["id"]))}
+        change_boost = 1 + settings.PLAN_CHANGE_WEIGHT * changes[section["id"]] / max_change
+        empty = empty_dates.for_section(section["id"]) if empty_dates else set()
+        for date in dates:
+            if date in stored or date in empty:
+                continue
+
+            candidates = collection_stats.order(section["id"], date, collections, explore=False) if collection_stats else collections
+            if settings.HEDGED_FETCH:
+                expected_requests = float(len(candidates))
+            else:
+                # Each fallback is only requested if every earlier candidate failed
+                expected_requests = 0.0
+                reach = 1.0
+                for collection in candidates:
+                    expected_requests += reach
+                    rate = collection_stats.success_rate(section["id"], date, collection["id"]) if collection_stats else 0.5
+                    reach *= 1 - rate
+
+            weeks_old = (newest - datetime.strptime(date, "%Y-%m-%d")).days / 7
+            plan.append({
+                "section_id": section["id"],
+                "location": section_location(section),
+                "date": date,
+                "collections": [c["id"] for c in candidates],
+                "expected_requests": expected_requests,
+                "processing_units": expected_requests * request_units,
+                "bytes": request_bytes,
+                "priority": 0.5 ** (weeks_old / settings.PLAN_RECENCY_HALF_LIFE_WEEKS) * change_boost
+            })
+
+    # Stable sort, so equal priorities keep the section order
+    plan.sort(key=lambda item: -item["priority"])
+    return plan
+
+def plan_from_disk(sections, dates, data_dir, collections):
+    """
+    Build the same plan as SatelliteService.plan_fetch from the stored imagery,
+    collection stats and empty dates alone, so --dry-run needs no credentials or network.
+    """
+    return plan_fetch(
+        sections,
+        dates,
+        os.path.join(data_dir, 'images'),
+        os.path.join(data_dir, settings.PROCESSED_DIR_NAME),
+        collections,
+        CollectionStats(os.path.join(data_dir, settings.COLLECTION_STATS_FILE)),
+        EmptyDates(os.path.join(data_dir, settings.EMPTY_DATES_FILE))
+    )
+
+def apply_budget(plan, budget=None):
+    """Split a prioritized plan into the items that fit in a processing-unit budget and the rest"""
+    if budget is None:
+        return plan, []
+    total = 0.0
+    for i, item in enumerate(plan):
+        if total + item["processing_units"] > budget:
+            return plan[:i], plan[i:]
+        total += item["processing_units"]
+    return plan, []
+
+def summarize_plan(plan):
+    """Totals of a plan"""
+    return {
+        "items": len(plan),
+        "sections": len({item["section_id"] for item in plan}),
+        "expected_requests": sum(item["expected_requests"] for item in plan),
+        "processing_units": sum(item["processing_units"] for item in plan),
+        "bytes": sum(item["bytes"] for item in plan)
+    }
+
+def print_plan(plan, budget=None, limit=10):
+    """Print the totals of a plan and its first items, as used by --dry-run"""
+    def describe(summary):
+        return (f"{summary['items']} images in {summary['sections']} sections, "
+                f"{summary['expected_requests']:.0f} requests, {summary['processing_units']:.1f} PU, "
+                f"{summary['bytes'] / 1e9:.2f} GB")
+
+    print(f"Plan: {describe(summarize_plan(plan))}")
+    if plan:
+        x_res, y_res = ground_resolution(plan[0]["location"]["bbox"])
+        print(f"Output {settings.IMAGE_WIDTH}x{settings.IMAGE_HEIGHT} px, about {x_res:.1f} x {y_res:.1f} m per pixel, {estimate_processing_units():.2f} PU per request")
+
+    if budget is not None:
+        within, deferred = apply_budget(plan, budget)
+        print(f"Within budget of {budget:.1f} PU: {describe(summarize_plan(within))}")
+        if deferred:
+            print(f"Deferred: {describe(summarize_plan(deferred))}")
+
+    for item in plan[:limit]:
+        print(f"  {item['date']} {item['section_id']}: priority {item['priority']:.3f}, {' -> '.join(item['collections'])}, {item['processing_units']:.1f} PU")
+    if len(plan) > limit:
+        print(f"  ... {len(plan) - limit} more")
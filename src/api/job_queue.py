@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import sys
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.api.collection_stats import RequestRejected
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    section_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    location TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    local_path TEXT,
+    PRIMARY KEY (section_id, date)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+CREATE TABLE IF NOT EXISTS rate_limit (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+def default_worker_id():
+    """Identify a worker by host and process id"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class JobQueue:
+    def __init__(self, path, lease_seconds=None, max_attempts=None, rate_per_minute=None):
+        """
+        Lease-based job queue for section x date fetch work, stored in a SQLite
+        file that any number of worker processes on any number of hosts can share.
+        A job is owned by one worker while its lease is valid; expired leases are
+        handed to the next worker that asks for work.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds or settings.QUEUE_LEASE_SECONDS
+        self.max_attempts = max_attempts or settings.QUEUE_MAX_ATTEMPTS
+        self.rate_per_minute = rate_per_minute or settings.QUEUE_RATE_LIMIT_PER_MINUTE
+
+        # Rollback journal rather than WAL, which does not work on network file systems
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Transaction(conn)
+
+    def seed(self, sections, dates):
+        """Add a job for every section x date pair; existing jobs are left untouched"""
+        rows = []
+        for section in sections:
+            location = json.dumps(section_location(section))
+            rows.extend((section["id"], date, location) for date in dates)
+
+        with self._connect() as conn:
+            before = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            conn.executemany("INSERT OR IGNORE INTO jobs (section_id, date, location) VALUES (?, ?, ?)", rows)
+            added = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+        print(f"Seeded {added} new jobs ({len(rows) - added} already queued)")
+        return added
+
+    def claim(self, worker_id):
+        """
+        Lease the next pending (or expired) job to a worker, or return None.
+        An expired lease counts as a failed attempt, since its worker crashed or
+        was killed, so a job that keeps killing workers ends up failed too.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', attempts = attempts + 1, last_error = 'lease expired', lease_expires = NULL "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts + 1 >= ?",
+                (now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT section_id, date, location, attempts, status FROM jobs "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY date, section_id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            attempts = row["attempts"] + (1 if row["status"] == "leased" else 0)
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = ?, "
+                "last_error = CASE WHEN status = 'leased' THEN 'lease expired' ELSE last_error END "
+                "WHERE section_id = ? AND date = ?",
+                (worker_id, now + self.lease_seconds, attempts, row["section_id"], row["date"])
+            )
+
+        return {
+            "section_id": row["section_id"],
+            "date": row["date"],
+            "location": json.loads(row["location"]),
+            "attempts": attempts
+        }
+
+    def heartbeat(self, job, worker_id):
+        """Extend a job's lease; returns False if the worker no longer holds it"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE section_id = ? AND date = ? AND status = 'leased' AND worker = ?",
+                (time.time() + self.lease_seconds, job["section_id"], job["date"], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job, worker_id, local_path=None):
+        """Mark a leased job as done; ignored if the lease was lost to another worker"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, local_path = ? "
+                "WHERE section_id = ? AND date = ? AND status = 'leased' AND worker = ?",
+                (local_path, job["section_id"], job["date"], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job, worker_id, error):
+        """Return a job to the queue, or mark it failed once it ran out of attempts"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET attempts = attempts + 1, last_error = ?, lease_expires = NULL, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE section_id = ? AND date = ? AND status = 'leased' AND worker = ?",
+                (str(error), self.max_attempts, job["section_id"], job["date"], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, job, worker_id):
+        """Return a job to the queue without counting an attempt"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', lease_expires = NULL "
+                "WHERE section_id = ? AND date = ? AND status = 'leased' AND worker = ?",
+                (job["section_id"], job["date"], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def acquire_rate_token(self):
+        """
+        Take one request token from the global token bucket shared by all workers.
+        Returns 0 if a token was taken, otherwise the number of seconds to wait.
+        """
+        now = time.time()
+        capacity = max(1.0, self.rate_per_minute / 60.0 * settings.QUEUE_RATE_BURST_SECONDS)
+        with self._connect() as conn:
+            row = conn.execute("SELECT tokens, updated FROM rate_limit WHERE id = 0").fetchone()
+            if row is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, row["tokens"] + (now - row["updated"]) * self.rate_per_minute / 60.0)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) * 60.0 / self.rate_per_minute
+            conn.execute("INSERT OR REPLACE INTO rate_limit (id, tokens, updated) VALUES (0, ?, ?)", (tokens, now))
+        return wait
+
+    def wait_for_rate_token(self):
+        """Block until the global rate limit allows another request"""
+        while True:
+            wait = self.acquire_rate_token()
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    def stats(self):
+        """Number of jobs per status, including leases that have expired"""
+        with self._connect() as conn:
+            counts = {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            counts["expired"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'leased' AND lease_expires < ?", (time.time(),)
+            ).fetchone()[0]
+        return counts
+
+class _Transaction:
+    def __init__(self, conn):
+        """Context manager running a block in an immediate (write-locked) transaction"""
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+def section_location(section):
+    """Build the location dict expected by SatelliteService.fetch_imagery"""
+    return {
+        "lat": section["center"]["lat"],
+        "lon": section["center"]["lon"],
+        "bbox": [
+            section["bounds"]["min_lon"],
+            section["bounds"]["min_lat"],
+            section["bounds"]["max_lon"],
+            section["bounds"]["max_lat"]
+        ],
+        "section_id": section["id"]
+    }
+
+def run_worker(service, queue, worker_id=None):
+    """
+    Claim and fetch jobs until the queue is drained.
+    A background thread heartbeats the current lease so long fetches are not
+    handed to another worker. The queue becomes the service's rate limiter, so
+    every HTTP request (fallbacks, hedged requests and retries included) waits
+    for the global rate limit, not just every job.
+    """
+    worker_id = worker_id or default_worker_id()
+    service.rate_limiter = queue
+    print(f"Worker {worker_id} started on queue {queue.path}")
+    fetched = 0
+
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            counts = queue.stats()
+            if counts.get("leased", 0) == 0:
+                break
+            # Other workers still hold leases that may expire and come back
+            time.sleep(settings.QUEUE_POLL_SECONDS)
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat_loop, args=(queue, job, worker_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            print(f"[{worker_id}] Fetching {job['section_id']} on {job['date']} (attempt {job['attempts'] + 1})")
+            # The job is only completed once the image is on disk (or failed if it cannot be written), which may be after the next claim
+            imagery_data = service.fetch_imagery(
+                location=job["location"],
+                date=job["date"],
+                on_saved=lambda data, job=job: queue.complete(job, worker_id, data.local_path),
+                on_failed=lambda data, error, job=job: queue.fail(job, worker_id, error)
+            )
+            if imagery_data:
+                fetched += 1
+            else:
+                queue.complete(job, worker_id)
+        except RequestRejected as e:
+            # Every other job would be refused too; leave them for a fixed configuration
+            print(f"[{worker_id}] ERROR: {str(e)} - stopping the worker")
+            queue.release(job, worker_id)
+            if hasattr(service, "flush_writes"):
+                service.flush_writes()
+            raise
+        except Exception as e:
+            print(f"[{worker_id}] Error fetching {job['section_id']} on {job['date']}: {str(e)}")
+            queue.fail(job, worker_id, e)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    if hasattr(service, "flush_writes"):
+        service.flush_writes()
+    print(f"Worker {worker_id} finished: fetched {fetched} images")
+    return fetched
+
+def _heartbeat_loop(queue, job, worker_id, stop):
+    while not stop.wait(settings.QUEUE_HEARTBEAT_SECONDS):
+        if not queue.heartbeat(job, worker_id):
+            print(f"[{worker_id}] Lost lease on {job['section_id']} {job['date']}")
+            return
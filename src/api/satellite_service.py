@@ -1,9 +1,13 @@
 import os
+import io
 import json
+import tarfile
 import requests
 from datetime import datetime
 import time
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # Add the project root directory to Python path
@@ -11,7 +15,19 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from src.config import settings
 from src.models.imagery_data import ImageryData
+from src.models.aoi import sections_for_aois
+from src.utils.image_stats import compute_image_stats
 from src.utils.geo_helpers import load_gaza_bounds, divide_region_into_sections, generate_weekly_dates, divide_gaza_into_sections
+from src.api.disk_writer import WriteBehindWriter, encode_image, storage_extension, write_atomic
+from src.api.job_queue import JobQueue, section_location, run_worker
+from src.api.collection_stats import CollectionStats, EmptyDates, RequestRejected
+from src.api.fetch_planner import plan_fetch, estimate_processing_units
+from src.processing.scheduler import run_processing
+from src.processing.coregistration import coregister_sections
+from src.processing.timeline import render_timelines
+from src.processing.compare import render_comparisons
+from src.processing.spectral import bands_dir, update_spectral_series
+from src.processing.hotspots import update_hotspots, HotspotIndex, INDEX_FILE_NAME
 
 class SatelliteService:
     def __init__(self, api_key=None, instance_id=None):
@@ -24,6 +40,12 @@ class SatelliteService:
         self.token = None
         self.token_expiry = 0
         
+        # Shared token bucket (e.g. the job queue) taken once per Processing API request, if set
+        self.rate_limiter = None
+        
+        # Write-behind image writer, started on first use
+        self.writer = None
+        
         # Root directory for data storage
         self.project_dir = str(Path(__file__).parent.parent.parent)
         self.data_dir = os.path.join(self.project_dir, settings.DATA_DIR)
@@ -31,8 +53,21 @@ class SatelliteService:
         # Create directories if they don't exist
         self.images_dir = os.path.join(self.data_dir, 'images')
         self.metadata_dir = os.path.join(self.data_dir, 'metadata')
+        self.processed_dir = os.path.join(self.data_dir, settings.PROCESSED_DIR_NAME)
+        self.aois_dir = os.path.join(self.data_dir, 'aois')
         os.makedirs(self.images_dir, exist_ok=True)
         os.makedirs(self.metadata_dir, exist_ok=True)
+        os.makedirs(self.processed_dir, exist_ok=True)
+        
+        # Per-section/period success rates of each collection, used to order fetch attempts
+        self.collection_stats = CollectionStats(os.path.join(self.data_dir, settings.COLLECTION_STATS_FILE))
+        # Section dates that no collection has a valid image for, left out of fetch plans
+        self.empty_dates = EmptyDates(os.path.join(self.data_dir, settings.EMPTY_DATES_FILE))
+        
+        # Estimated processing units spent by this service, checked against the fetch budget
+        self.request_units = estimate_processing_units()
+        self.processing_units_used = 0.0
+        self.usage_lock = threading.Lock()
         
         # Get initial token
         token = self.get_oauth_token()
@@ -79,16 +114,15 @@ class SatelliteService:
         # Get a new token
         return self._get_oauth_token()
     
-    def fetch_imagery_for_gaza(self):
-        """
-        Fetch satellite imagery for the Gaza Strip region.
-        """
+    @staticmethod
+    def get_sections():
+        """Divide the Gaza Strip into the configured grid of sections"""
         # Use Gaza bounds from settings.py
         gaza_bounds = settings.GAZA_BOUNDS
         
         # Generate sections with eastern shift applied
         print("Creating sections with eastern shift for section_10...")
-        sections = divide_region_into_sections(
+        return divide_region_into_sections(
             gaza_bounds["min_lat"],
             gaza_bounds["max_lat"],
             gaza_bounds["min_lon"],
@@ -96,6 +130,25 @@ class SatelliteService:
             settings.NUM_SECTIONS_LAT,
             settings.NUM_SECTIONS_LON
         )
+    
+    def get_aoi_sections(self, aois):
+        """
+        Section plan for a set of AOIs loaded from GeoJSON.
+        Writes each AOI's manifest to data/aois/<name>/ and returns the union
+        of their grid cells, so cells shared by several AOIs are fetched once.
+        """
+        for aoi in aois.values():
+            print(f"AOI {aoi.name}: manifest written to {aoi.write_manifest(self.aois_dir)}")
+        sections = sections_for_aois(aois)
+        print(f"{len(sections)} unique sections across {len(aois)} AOIs")
+        return sections
+    
+    def fetch_imagery_for_gaza(self, sections=None):
+        """
+        Fetch satellite imagery for the Gaza Strip region,
+        or for the given sections (e.g. the cells of one or more AOIs).
+        """
+        sections = sections or self.get_sections()
         
         # Generate weekly dates
         dates = generate_weekly_dates(settings.START_DATE, settings.END_DATE)
@@ -126,34 +179,79 @@ class SatelliteService:
             for date in dates:
                 print(f"Fetching imagery for section {section_id} on {date}...")
                 try:
-                    imagery_data = self.fetch_imagery(
-                        location={
-                            "lat": section["center"]["lat"],
-                            "lon": section["center"]["lon"],
-                            "bbox": [
-                                section["bounds"]["min_lon"],
-                                section["bounds"]["min_lat"],
-                                section["bounds"]["max_lon"],
-                                section["bounds"]["max_lat"]
-                            ],
-                            "section_id": section_id
-                        }, 
-                        date=date
-                    )
+                    imagery_data = self.fetch_imagery(location=section_location(section), date=date)
                     if imagery_data:
                         all_imagery.append(imagery_data)
                     time.sleep(1)
+                except RequestRejected as e:
+                    print(f"ERROR: {str(e)} - stopping the fetch, check the configuration and account")
+                    self.flush_writes()
+                    raise
                 except Exception as e:
                     print(f"Error fetching imagery for section {section_id} on {date}: {str(e)}")
         
+        # Make sure everything handed to the writer is on disk before returning
+        all_imagery = self.drop_unsaved(all_imagery, self.flush_writes())
         print(f"Successfully fetched {len(all_imagery)} images")
         return all_imagery
         
-    def fetch_imagery(self, location, date):
+    def plan_fetch(self, sections=None):
+        """
+        Prioritized section x date plan of the imagery not stored yet,
+        with the estimated processing units and bytes of every item.
+        """
+        dates = generate_weekly_dates(settings.START_DATE, settings.END_DATE)
+        return plan_fetch(sections or self.get_sections(), dates, self.images_dir, self.processed_dir, self.get_collections(), self.collection_stats, self.empty_dates)
+    
+    def fetch_planned(self, plan, budget=None):
+        """
+        Fetch the items of a plan in priority order until the processing-unit
+        budget (FETCH_BUDGET_PU if not given) would be exceeded.
+        """
+        budget = settings.FETCH_BUDGET_PU if budget is None else budget
+        start_units = self.processing_units_used
+        all_imagery = []
+        
+        for i, item in enumerate(plan):
+            spent = self.processing_units_used - start_units
+            if budget is not None and spent + item["processing_units"] > budget:
+                print(f"Budget of {budget:.1f} PU reached after {spent:.1f} PU; {len(plan) - i} planned images deferred")
+                break
+            
+            print(f"Fetching imagery for section {item['section_id']} on {item['date']} (priority {item['priority']:.3f})...")
+            try:
+                imagery_data = self.fetch_imagery(location=item["location"], date=item["date"])
+                if imagery_data:
+                    all_imagery.append(imagery_data)
+                time.sleep(1)
+            except RequestRejected as e:
+                print(f"ERROR: {str(e)} - stopping the fetch, check the configuration and account")
+                self.flush_writes()
+                raise
+            except Exception as e:
+                print(f"Error fetching imagery for section {item['section_id']} on {item['date']}: {str(e)}")
+        
+        # Make sure everything handed to the writer is on disk before returning
+        all_imagery = self.drop_unsaved(all_imagery, self.flush_writes())
+        print(f"Successfully fetched {len(all_imagery)} images using about {self.processing_units_used - start_units:.1f} PU")
+        return all_imagery
+    
+    def fetch_imagery(self, location, date, on_saved=None, on_failed=None):
         """
         Fetch satellite imagery using Sentinel Hub Processing API.
         Enhanced to get better quality images with adaptive date range based on cloud coverage.
+        on_saved(imagery_data) is called once the image and its metadata are on disk,
+        on_failed(imagery_data, error) if the write-behind writer could not store it.
         """
+        # Imagery for the same section and date may already be stored, e.g. by another AOI sharing the cell
+        if settings.REUSE_STORED_IMAGERY:
+            cached = self.get_stored_imagery(location, date)
+            if cached:
+                print(f"Using stored imagery {cached.local_path}")
+                if on_saved:
+                    on_saved(cached)
+                return cached
+        
         # Use the OAuth token instead of api_key
         token = self.get_oauth_token()
         headers = {
@@ -180,136 +278,248 @@ class SatelliteService:
         
         print(f"Using extended date range: {extended_date_from} to {extended_date_to}")
         
-        # Collection-specific parameters
-        collections = [
+        # With SPECTRAL_BANDS the raw bands come back as a second output of the same request
+        responses = [{
+            "identifier": "default",
+            "format": {
+                "type": settings.IMAGE_MIME_TYPE
+            }
+        }]
+        if settings.SPECTRAL_BANDS:
+            responses.append({"identifier": "bands", "format": {"type": "image/png"}})
+            headers["Accept"] = "application/x-tar"
+        
+        # Try the collections most likely to succeed for this section and period first
+        section_id = location["section_id"]
+        collections = self.get_collections()
+        candidates = self.collection_stats.order(section_id, date, collections)
+        skipped = [c["id"] for c in collections if c not in candidates]
+        if skipped:
+            print(f"Skipping {', '.join(skipped)} for {section_id} in {date[:7]} (low success rate)")
+        
+        date_range = (extended_date_from, extended_date_to)
+        if settings.HEDGED_FETCH and len(candidates) > 1:
+            result, definite = self._fetch_hedged(candidates, location, date, date_range, responses, headers)
+        else:
+            result = None
+            all_definite = True
+            for collection in candidates:
+                result, definite = self._fetch_collection(collection, location, date, date_range, responses, headers)
+                # Only valid images and quality rejections say anything about the collection
+                if definite:
+                    self.collection_stats.record(section_id, date, collection["id"], result is not None)
+                all_definite = all_definite and definite
+                if result:
+                    break
+            definite = all_definite
+        
+        if result is None:
+            print(f"Could not obtain valid imagery for {date}")
+            # Only when every collection failed its quality check over a window that has already
+            # ended is there nothing to fetch; later acquisitions can still fill a current window
+            if definite and len(candidates) == len(collections) and extended_date_to < datetime.now().strftime("%Y-%m-%d"):
+                self.empty_dates.add(section_id, date)
+            return None
+        
+        collection, image_data, bands_data = result
+        
+        # Compute the stats vector once, so later queries never decode the image
+        stats = self.compute_stats(image_data)
+        
+        section_dir = os.path.join(self.images_dir, section_id)
+        local_path = os.path.join(section_dir, f"{date}.{storage_extension()}")
+        
+        # Create an ImageryData object
+        imagery_data = ImageryData(
+            image_url="",
+            image_data=image_data,
+            timestamp=date,
+            metadata={
+                "source": "Sentinel Hub",
+                "collection": collection["id"],
+                "bbox": location["bbox"],
+                "date_range": f"{extended_date_from} to {extended_date_to}",
+                "stats": stats
+            },
+            section_id=section_id,
+            local_path=local_path
+        )
+        if bands_data:
+            imagery_data.metadata["bands_path"] = os.path.join(bands_dir(self.images_dir, section_id), f"{date}.png")
+        
+        # Save the image and its metadata (on the writer threads if write-behind is enabled)
+        self.store_image(imagery_data, on_saved=on_saved, bands_data=bands_data, on_failed=on_failed)
+        return imagery_data
+    
+    @staticmethod
+    def get_collections():
+        """Collection-specific parameters, in the default order they are tried"""
+        evalscript = settings.SPECTRAL_EVALSCRIPT if settings.SPECTRAL_BANDS else settings.EVALSCRIPT
+        return [
             {
                 "id": "sentinel-2-l2a",
-                "evalscript": settings.EVALSCRIPT,
+                "evalscript": evalscript,
                 "time_from": settings.TIME_FROM,
                 "time_to": settings.TIME_TO
             },
             {
                 "id": "sentinel-2-l1c",
-                "evalscript": settings.EVALSCRIPT,
+                "evalscript": evalscript,
                 "time_from": settings.TIME_FROM,
                 "time_to": settings.TIME_TO
             }
         ]
+    
+    def _fetch_collection(self, collection, location, date, date_range, responses, headers):
+        """
+        Request one collection, retrying on expired tokens, rate limits and network errors.
+        Returns (result, definite): result is (collection, image_data, bands_data) for a
+        valid image, otherwise None; definite is True only for a valid image or a quality
+        rejection, the outcomes that say something about the collection's data.
+        Raises RequestRejected on 400/403, which no other request would get around.
+        """
+        print(f"Trying {collection['id']} for {date} (extended range)...")
+        headers = dict(headers)
         
-        for collection in collections:
-            print(f"Trying {collection['id']} for {date} (extended range)...")
-            
-            # Create request payload with expanded parameters
-            payload = {
-                "input": {
-                    "bounds": {
-                        "bbox": location["bbox"],
-                        "properties": {
-                            "crs": "http://www.opengis.net/def/crs/EPSG/0/4326"
-                        }
-                    },
-                    "data": [{
-                        "dataFilter": {
-                            "timeRange": {
-                                "from": f"{extended_date_from}T{collection['time_from']}",
-                                "to": f"{extended_date_to}T{collection['time_to']}"
-                            },
-                            "mosaickingOrder": "leastCC",  # Least cloud coverage
-                            "maxCloudCoverage": settings.CLOUD_COVERAGE_PERCENTAGE
-                        },
-                        "type": collection["id"]
-                    }]
-                },
-                "output": {
-                    "width": settings.IMAGE_WIDTH,
-                    "height": settings.IMAGE_HEIGHT,
-                    "responses": [{
-                        "identifier": "default",
-                        "format": {
-                            "type": settings.IMAGE_MIME_TYPE
-                        }
-                    }]
+        # Create request payload with expanded parameters
+        payload = {
+            "input": {
+                "bounds": {
+                    "bbox": location["bbox"],
+                    "properties": {
+                        "crs": "http://www.opengis.net/def/crs/EPSG/0/4326"
+                    }
                 },
-                "evalscript": collection["evalscript"]
-            }
-            
-            retries = 0
-            while retries < settings.MAX_RETRIES:
-                try:
-                    response = requests.post(
-                        self.api_endpoint,
-                        json=payload,
-                        headers=headers,
-                        verify=settings.VERIFY_SSL,
-                        timeout=settings.TIMEOUT
-                    )
+                "data": [{
+                    "dataFilter": {
+                        "timeRange": {
+                            "from": f"{date_range[0]}T{collection['time_from']}",
+                            "to": f"{date_range[1]}T{collection['time_to']}"
+                        },
+                        "mosaickingOrder": "leastCC",  # Least cloud coverage
+                        "maxCloudCoverage": settings.CLOUD_COVERAGE_PERCENTAGE
+                    },
+                    "type": collection["id"]
+                }]
+            },
+            "output": {
+                "width": settings.IMAGE_WIDTH,
+                "height": settings.IMAGE_HEIGHT,
+                "responses": responses
+            },
+            "evalscript": collection["evalscript"]
+        }
+        
+        retries = 0
+        while retries < settings.MAX_RETRIES:
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait_for_rate_token()
+            try:
+                response = requests.post(
+                    self.api_endpoint,
+                    json=payload,
+                    headers=headers,
+                    verify=settings.VERIFY_SSL,
+                    timeout=settings.TIMEOUT
+                )
+                
+                if response.status_code == 200:
+                    with self.usage_lock:
+                        self.processing_units_used += self.request_units
                     
-                    if response.status_code == 200:
-                        # For Sentinel Hub, the image is directly in the response body
-                        image_data = response.content
-                        
-                        # Check if the image meets quality standards
-                        if self.is_image_valid(image_data):
-                            # Save the image
-                            section_dir = os.path.join(self.images_dir, location["section_id"])
-                            os.makedirs(section_dir, exist_ok=True)
-                            local_path = os.path.join(section_dir, f"{date}.{settings.IMAGE_FORMAT}")
-                            with open(local_path, 'wb') as f:
-                                f.write(image_data)
-                            print(f"Image saved to {local_path}")
-                            
-                            # Create an ImageryData object
-                            imagery_data = ImageryData(
-                                image_url="",
-                                image_data=image_data,
-                                timestamp=date,
-                                metadata={
-                                    "source": "Sentinel Hub",
-                                    "collection": collection["id"],
-                                    "bbox": location["bbox"],
-                                    "date_range": f"{extended_date_from} to {extended_date_to}"
-                                },
-                                section_id=location["section_id"],
-                                local_path=local_path
-                            )
-                            
-                            # Save metadata
-                            self.save_metadata(imagery_data)
-                            return imagery_data
-                        else:
-                            print(f"Image failed quality check - trying next option")
-                            break
-                        
-                    elif response.status_code == 401:  # Unauthorized
-                        print(f"Token expired. Getting new token...")
-                        token = self._get_oauth_token()  # Force token refresh
-                        if token:
-                            headers["Authorization"] = f"Bearer {token}"
-                            retries += 1
-                        else:
-                            print("Failed to refresh token")
-                            break
-                            
-                    elif response.status_code == 429:  # Rate limit exceeded
-                        wait_time = settings.RETRY_DELAY * (2 ** retries)
-                        print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
+                    # For Sentinel Hub, the image is directly in the response body
+                    # (or in a tar archive with one file per output when bands are requested)
+                    image_data = response.content
+                    bands_data = None
+                    if settings.SPECTRAL_BANDS:
+                        try:
+                            outputs = self.split_outputs(response.content)
+                        except tarfile.TarError as e:
+                            # An unexpected body says nothing about the collection's data
+                            print(f"Response is not a multi-output archive ({str(e)}) - trying next option")
+                            return None, False
+                        image_data = outputs.get("default", b"")
+                        bands_data = outputs.get("bands")
+                    
+                    # Check if the image meets quality standards
+                    if self.is_image_valid(image_data):
+                        return (collection, image_data, bands_data), True
+                    print(f"Image failed quality check - trying next option")
+                    return None, True
+                    
+                elif response.status_code == 401:  # Unauthorized
+                    print(f"Token expired. Getting new token...")
+                    token = self._get_oauth_token()  # Force token refresh
+                    if token:
+                        headers["Authorization"] = f"Bearer {token}"
                         retries += 1
-                        
                     else:
-                        print(f"Failed to fetch imagery: {response.status_code}, {response.text}")
-                        break
+                        print("Failed to refresh token")
+                        return None, False
                         
-                except requests.exceptions.RequestException as e:
-                    print(f"Request failed: {str(e)}")
+                elif response.status_code == 429:  # Rate limit exceeded
+                    wait_time = settings.RETRY_DELAY * (2 ** retries)
+                    print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
+                    time.sleep(wait_time)
                     retries += 1
-                    if retries < settings.MAX_RETRIES:
-                        time.sleep(settings.RETRY_DELAY)
-                    else:
-                        break
+                    
+                elif response.status_code in (400, 403):
+                    # A bad request or an account/quota problem, not a lack of data
+                    raise RequestRejected(f"Sentinel Hub rejected the request with {response.status_code}: {response.text}")
+                    
+                else:
+                    print(f"Failed to fetch imagery: {response.status_code}, {response.text}")
+                    # Only a quality rejection shows the collection has no data here
+                    return None, False
+                    
+            except requests.exceptions.RequestException as e:
+                print(f"Request failed: {str(e)}")
+                retries += 1
+                if retries < settings.MAX_RETRIES:
+                    time.sleep(settings.RETRY_DELAY)
+        
+        return None, False
+    
+    def _fetch_hedged(self, candidates, location, date, date_range, responses, headers):
+        """
+        Request every candidate collection concurrently and return (result, definite)
+        for the first valid result, like _fetch_collection. Without a valid result,
+        definite is True only if every request failed definitely.
+        Slower requests keep running in the background only to record their outcome.
+        """
+        section_id = location["section_id"]
+        executor = ThreadPoolExecutor(max_workers=len(candidates))
+        futures = {}
+        for collection in candidates:
+            future = executor.submit(self._fetch_collection, collection, location, date, date_range, responses, headers)
+            future.add_done_callback(
+                lambda f, collection_id=collection["id"]: self._record_hedged(section_id, date, collection_id, f)
+            )
+            futures[future] = collection
         
-        print(f"Could not obtain valid imagery for {date}")
-        return None
+        result = None
+        definite = True
+        for future in as_completed(futures):
+            if isinstance(future.exception(), RequestRejected):
+                executor.shutdown(wait=False)
+                raise future.exception()
+            if future.exception() is not None:
+                definite = False
+                continue
+            result, future_definite = future.result()
+            definite = definite and future_definite
+            if result is not None:
+                definite = True
+                break
+        executor.shutdown(wait=False)
+        return result, definite
+    
+    def _record_hedged(self, section_id, date, collection_id, future):
+        """Count the outcome of a hedged request, unless it failed for transient reasons"""
+        if future.exception() is None:
+            result, definite = future.result()
+            if definite:
+                self.collection_stats.record(section_id, date, collection_id, result is not None)
     
     def is_image_valid(self, image_data, min_brightness=None, min_std_dev=None):
         """
@@ -339,6 +549,145 @@ class SatelliteService:
             print(f"Error validating image: {str(e)}")
             return True  # Accept image if we can't validate
     
+    def compute_stats(self, image_data):
+        """Compute ingest stats for an image, or None if it cannot be decoded"""
+        try:
+            return compute_image_stats(image_data, reduce_factor=settings.STATS_REDUCE_FACTOR)
+        except Exception as e:
+            print(f"Error computing image stats: {str(e)}")
+            return None
+    
+    def backfill_image_stats(self):
+        """Add ingest stats to metadata of images fetched before stats existed"""
+        updated = 0
+        for name in sorted(os.listdir(self.metadata_dir)):
+            if not name.endswith(".json"):
+                continue
+            metadata_path = os.path.join(self.metadata_dir, name)
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            
+            local_path = metadata.get("local_path")
+            if metadata.get("stats") or not local_path or not os.path.isfile(local_path):
+                continue
+            
+            with open(local_path, 'rb') as f:
+                metadata["stats"] = self.compute_stats(f.read())
+            with open(metadata_path, 'w') as f:
+                json.dump(metadata, f, indent=2)
+            updated += 1
+        
+        print(f"Added stats to {updated} metadata files")
+        return updated
+    
+    def get_stored_imagery(self, location, date):
+        """
+        Return the stored ImageryData for a section and date if its image exists
+        and was fetched for the same bounding box (with bands, if SPECTRAL_BANDS
+        is on), otherwise None.
+        """
+        metadata_path = os.path.join(self.metadata_dir, f"{location['section_id']}_{date}.json")
+        if not os.path.isfile(metadata_path):
+            return None
+        
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+        except (ValueError, OSError):
+            return None
+        
+        bbox = metadata.get("bbox")
+        local_path = metadata.get("local_path")
+        if not bbox or not local_path or not os.path.isfile(local_path):
+            return None
+        if any(abs(a - b) > 1e-6 for a, b in zip(bbox, location["bbox"])):
+            return None
+        # Images stored without bands cannot serve a fetch that asks for them
+        if settings.SPECTRAL_BANDS and not (metadata.get("bands_path") and os.path.isfile(metadata["bands_path"])):
+            return None
+        
+        return ImageryData(
+            image_url="",
+            timestamp=date,
+            metadata={k: v for k, v in metadata.items() if k not in ("timestamp", "section_id", "local_path")},
+            section_id=location["section_id"],
+            local_path=local_path
+        )
+    
+    def store_image(self, imagery_data, on_saved=None, bands_data=None, on_failed=None):
+        """
+        Persist an image and then its metadata, so metadata never points at a missing file.
+        With WRITE_BEHIND enabled the work is queued to the writer threads and this returns immediately;
+        if a file cannot be written, no metadata is saved and on_failed(imagery_data, error) is called once.
+        Band images are stored as received, since their values are measurements rather than colours.
+        """
+        files = [(imagery_data.image_data, imagery_data.local_path, None)]
+        if bands_data:
+            files.append((bands_data, imagery_data.metadata["bands_path"], "original"))
+        
+        # Metadata is written once every file of the image is on disk
+        state = {"remaining": len(files), "failed": False}
+        lock = threading.Lock()
+        
+        def file_saved():
+            with lock:
+                state["remaining"] -= 1
+                if state["remaining"] or state["failed"]:
+                    return
+            self.save_metadata(imagery_data)
+            if on_saved:
+                on_saved(imagery_data)
+        
+        def file_failed(error):
+            with lock:
+                if state["failed"]:
+                    return
+                state["failed"] = True
+            if on_failed:
+                on_failed(imagery_data, error)
+        
+        for data, path, codec in files:
+            if settings.WRITE_BEHIND:
+                if self.writer is None:
+                    self.writer = WriteBehindWriter()
+                self.writer.submit(data, path, on_saved=file_saved, codec=codec, on_failed=file_failed)
+            else:
+                write_atomic(path, encode_image(data, codec))
+                print(f"Image saved to {path}")
+                file_saved()
+    
+    @staticmethod
+    def split_outputs(content):
+        """Split a multi-output (tar) response into a dict of output identifier -> bytes"""
+        outputs = {}
+        with tarfile.open(fileobj=io.BytesIO(content)) as archive:
+            for member in archive.getmembers():
+                if member.isfile():
+                    outputs[os.path.splitext(os.path.basename(member.name))[0]] = archive.extractfile(member).read()
+        return outputs
+    
+    def flush_writes(self):
+        """Wait until all queued images are written; returns the paths that could not be written"""
+        failures = self.writer.flush() if self.writer is not None else []
+        self.collection_stats.save()
+        self.empty_dates.save()
+        return {path for path, _ in failures}
+    
+    @staticmethod
+    def drop_unsaved(all_imagery, unsaved_paths):
+        """Leave out fetched images whose image or band file failed to be written"""
+        if unsaved_paths:
+            print(f"{len(unsaved_paths)} files could not be written")
+        return [data for data in all_imagery if not unsaved_paths & {data.local_path, data.metadata.get("bands_path")}]
+    
+    def close(self):
+        """Write out queued images and stop the writer threads"""
+        self.collection_stats.save()
+        self.empty_dates.save()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+    
     def save_metadata(self, imagery_data):
         """Save metadata for an image"""
         metadata_path = os.path.join(self.metadata_dir, f"{imagery_data.section_id}_{imagery_data.timestamp}.json")
@@ -355,14 +704,74 @@ class SatelliteService:
             
         print(f"Metadata saved to {metadata_path}")
     
-    def process_imagery(self, imagery_data=None):
+    def seed_job_queue(self, queue_path, sections=None):
+        """Seed a shared job queue with the full section x date plan"""
+        queue = JobQueue(queue_path)
+        dates = generate_weekly_dates(settings.START_DATE, settings.END_DATE)
+        queue.seed(sections or self.get_sections(), dates)
+        return queue.stats()
+    
+    def run_queue_worker(self, queue_path, worker_id=None):
+        """Fetch jobs from a shared job queue until it is drained"""
+        return run_worker(self, JobQueue(queue_path), worker_id=worker_id)
+    
+    def process_imagery(self, imagery_data=None, max_workers=None, incremental=True, section_ids=None):
+        """
+        Process imagery data - analyze changes between consecutive dates.
+        Work is split into (section, date-range) chunks and run on a process pool.
+        If a list of ImageryData or section_ids is given, only those sections are processed.
+        With incremental=True, dates already processed from the same inputs are skipped.
+        """
+        if isinstance(imagery_data, list):
+            section_ids = sorted({item.section_id for item in imagery_data if item.section_id})
+
+        # Align new images with their section reference so small shifts are not reported as change
+        if settings.COREGISTER:
+            coregister_sections(self.images_dir, self.metadata_dir, max_workers=max_workers, section_ids=section_ids)
+        
+        summary = run_processing(self.images_dir, self.processed_dir, max_workers=max_workers, section_ids=section_ids, incremental=incremental, metadata_dir=self.metadata_dir)
+        
+        # Append NDVI/NDBI/NBR summaries for new band images to the spectral time series
+        update_spectral_series(self.images_dir, self.processed_dir, metadata_dir=self.metadata_dir, max_workers=max_workers, section_ids=section_ids, incremental=incremental)
+        
+        # Add hotspots from the new change masks to the spatial index
+        update_hotspots(self.processed_dir, self.metadata_dir, max_workers=max_workers, section_ids=section_ids, incremental=incremental)
+
+        for section_id, section in summary["sections"].items():
+            print(f"{section_id}: {section['images']} images, max change {section['max_change']:.2%} on {section['max_change_date']}")
+        print(f"Processed {summary['images']} images in {summary['elapsed_seconds']:.1f} seconds ({summary['failed_tasks']} failed tasks)")
+        return summary
+
+    def find_hotspots(self, bbox=None, start=None, end=None, k=None, section_ids=None):
+        """
+        Print and return the k locations with the most changed area inside bbox
+        [min_lon, min_lat, max_lon, max_lat] between start and end (inclusive),
+        optionally only in the given sections (e.g. the cells of the selected AOIs).
+        """
+        index = HotspotIndex(os.path.join(self.processed_dir, INDEX_FILE_NAME))
+        hotspots = index.top_k(k, bbox=bbox, start=start, end=end, section_ids=section_ids)
+        print(f"Top {len(hotspots)} hotspots out of {len(index)} indexed")
+        for rank, hotspot in enumerate(hotspots, 1):
+            min_lon, min_lat, max_lon, max_lat = hotspot["bbox"]
+            print(f"{rank:>3}. {hotspot['section_id']} lat {min_lat:.5f}-{max_lat:.5f}, lon {min_lon:.5f}-{max_lon:.5f}: "
+                  f"{hotspot['area_km2']:.3f} km2 changed over {hotspot['dates']} dates ({hotspot['first_date']} to {hotspot['last_date']})")
+        return hotspots
+    
+    def create_timelines(self, fmt=None, max_workers=None, section_ids=None):
+        """Render a timeline animation per section from the stored imagery"""
+        results, failed = render_timelines(self.images_dir, self.processed_dir, fmt=fmt, max_workers=max_workers, section_ids=section_ids)
+        if failed:
+            print(f"Failed to render {len(failed)} timelines")
+        return results
+
+    def create_comparisons(self, date_a, date_b=None, mode=None, max_workers=None, section_ids=None):
         """
-        Process imagery data - analyze changes, create visualizations, etc.
-        Can be implemented later based on specific requirements.
+        Render before/after comparisons for every section.
+        Compares date_a against date_b, or against every later date if date_b is not given.
         """
-        print("Processing imagery (placeholder method)")
-        # TODO: Implement imagery processing logic as needed
-        return True
+        results, failed = render_comparisons(self.images_dir, self.processed_dir, date_a, date_b, mode=mode, max_workers=max_workers, section_ids=section_ids)
+        print(f"Saved {sum(len(r['outputs']) for r in results)} comparisons ({len(failed)} failed tasks)")
+        return results
 
     # Add a save_image method to your SatelliteService class
     def save_image(self, image_data, local_path):
@@ -33,6 +33,15 @@ REFERENCE_SECTION = {
     "min_lon": 34.219500,  
 }
 
+# Areas of interest loaded from GeoJSON (used with --aoi); Gaza keeps the grid above by default.
+# AOIs are covered by a global grid of fixed-size cells so overlapping AOIs share cells and imagery.
+AOI_DIR = "../aois"
+AOI_CELL_SIZE_LAT = 0.05   # Degrees
+AOI_CELL_SIZE_LON = 0.1    # Degrees (about twice the height, matching the 2028x1024 output)
+
+# Skip the request when the image for a section and date is already stored for the same bbox
+REUSE_STORED_IMAGERY = True
+
 # Gaza Strip full boundaries (update it for better accuracy)
 GAZA_BOUNDS = {
     "min_lat": 31.235845,    # Southernmost point
@@ -60,6 +69,16 @@ VIEW_PARAMS = {
 # Storage settings
 DATA_DIR = "../data"
 
+# Write-behind storage: fetched images are written by dedicated threads so requests never wait on disk
+WRITE_BEHIND = True
+WRITER_THREADS = 2
+WRITER_QUEUE_SIZE = 32          # Payloads waiting to be written before fetching blocks
+# Storage encoding: "original" keeps the server's PNG, "png" re-encodes an optimized PNG,
+# "webp" stores lossless WebP (usually much smaller)
+IMAGE_STORAGE_CODEC = "original"
+IMAGE_STORAGE_LEVEL = 9         # PNG compression level (0-9)
+IMAGE_STORAGE_WEBP_EFFORT = 100 # WebP lossless compression effort (0-100)
+
 # Sentinel Hub specific settings
 CLOUD_COVERAGE_PERCENTAGE = 50  
 
@@ -115,11 +134,135 @@ function evaluatePixel(sample) {
 }
 """
 
+# Spectral bands: when enabled, each request also returns B04, B08, B11 and B12 as a second
+# output so NDVI/NDBI/NBR can be computed. Band images are stored in images/<section>/bands/.
+# Requests then read 6 input bands instead of 4, about 1.5x the processing units.
+SPECTRAL_BANDS = False
+SPECTRAL_VERSION = 1  # Bump to recompute the spectral index time series
+
+# Multi-output EVALSCRIPT used when SPECTRAL_BANDS is enabled: "default" is the same RGB
+# rendering as EVALSCRIPT, "bands" holds reflectance 0-0.6 scaled to 0-255 (one scale for
+# all bands, so normalized-difference indices are unaffected). No-data pixels are all zero.
+SPECTRAL_EVALSCRIPT = """
+//VERSION=3
+function setup() {
+  return {
+    input: [{
+      bands: ["B02", "B03", "B04", "B08", "B11", "B12", "dataMask"],
+      units: "REFLECTANCE"
+    }],
+    output: [
+      { id: "default", bands: 3, sampleType: "AUTO" },
+      { id: "bands", bands: 4, sampleType: "UINT8" }
+    ]
+  };
+}
+
+function scale(value) {
+  return Math.max(1, Math.min(255, Math.round(value / 0.6 * 255)));
+}
+
+function evaluatePixel(sample) {
+  let gain = 3.0;
+  let gamma = 0.8;
+  let r = Math.pow(Math.min(sample.B04 * gain, 1), gamma);
+  let g = Math.pow(Math.min(sample.B03 * gain, 1), gamma);
+  let b = Math.pow(Math.min(sample.B02 * gain, 1), gamma);
+  if (sample.B08) {
+    r = Math.min(r + sample.B08 * 0.1, 1.0);
+    g = Math.min(g + sample.B08 * 0.05, 1.0);
+  }
+
+  let bands = [0, 0, 0, 0];
+  if (sample.dataMask) {
+    bands = [scale(sample.B04), scale(sample.B08), scale(sample.B11), scale(sample.B12)];
+  }
+  return { default: [r, g, b], bands: bands };
+}
+"""
+
 # Image validation settings
 MIN_BRIGHTNESS = 0 
 MIN_STD_DEV = 0     
 
+# Ingest stats settings
+STATS_REDUCE_FACTOR = 4  # Cloud/no-data fractions are estimated on an image reduced by this factor
+
+# Collection selection: success rates of sentinel-2-l2a/l1c are tracked per section and month
+# (data/collection_stats.json) and the collection most likely to succeed is tried first
+COLLECTION_STATS_FILE = "collection_stats.json"
+COLLECTION_PRIOR_WEIGHT = 4      # Pseudo-attempts pulling sparse counts towards broader rates
+COLLECTION_SKIP_RATE = 0.1       # Collections below this smoothed success rate are not tried
+COLLECTION_SKIP_MIN_ATTEMPTS = 8  # ...once they were tried this often for the section or month
+COLLECTION_EXPLORE_RATE = 0.05   # Share of requests that still try skipped collections
+# Hedged fetching: request all candidate collections at once and keep the first valid image.
+# Lower latency per image at the cost of extra processing units.
+HEDGED_FETCH = False
+
+# Fetch planning: --fetch runs the section x date plan in priority order within an optional budget
+FETCH_BUDGET_PU = None            # Processing units per run (None = unlimited), overridden by --budget
+PLAN_RECENCY_HALF_LIFE_WEEKS = 8  # Priority halves for every this many weeks before the newest date
+PLAN_CHANGE_WEIGHT = 1.0          # Priority boost for the section with the most recent change
+PLAN_CHANGE_LOOKBACK = 4          # Processed dates considered as "recent change"
+PLAN_BYTES_PER_PIXEL = 0.6        # Compressed bytes per RGB pixel when no images are stored yet
+EMPTY_DATES_FILE = "empty_dates.json"  # Section dates where every collection returned no valid image; not planned again
+EMPTY_DATES_RETRY_DAYS = 90             # Empty dates are planned again after this many days
+
 # Request settings
 TIMEOUT = 180
 RETRY_DELAY = 5
-MAX_RETRIES = 10
\ No newline at end of file
+MAX_RETRIES = 10
+
+# Shared job queue settings (used by --queue/--worker)
+QUEUE_LEASE_SECONDS = 600          # A job is handed to another worker if not heartbeated for this long
+QUEUE_HEARTBEAT_SECONDS = 60
+QUEUE_MAX_ATTEMPTS = 3
+QUEUE_RATE_LIMIT_PER_MINUTE = 60   # Global request rate across all workers
+QUEUE_RATE_BURST_SECONDS = 5       # Tokens that may accumulate, in seconds of rate
+QUEUE_POLL_SECONDS = 10
+
+# Processing settings
+PROCESSED_DIR_NAME = "processed"
+PROCESS_WORKERS = None        # None uses all available cores
+PROCESS_CHUNK_SIZE = 12       # Dates per (section, date-range) task
+PROCESS_MAX_IN_FLIGHT = None  # None uses twice the number of workers
+PROCESS_MAX_RETRIES = 2
+CHANGE_THRESHOLD = 40         # Grayscale difference (0-255) counted as change
+# Bump whenever processing logic changes so existing outputs are recomputed
+PROCESSING_VERSION = 1
+
+# Change hotspots: change masks are reduced to cells of HOTSPOT_CELL_PX pixels and cells with at
+# least HOTSPOT_MIN_FRACTION changed pixels are stored, geo-referenced, in processed/hotspots.npz
+HOTSPOT_CELL_PX = 32
+HOTSPOT_MIN_FRACTION = 0.25
+HOTSPOT_INDEX_BUCKET_DEG = 0.01   # Grid-bucket size of the spatial index, in degrees
+HOTSPOT_TOP_K = 10
+HOTSPOT_VERSION = 1               # Bump to rebuild the hotspot index
+
+# Timeline settings
+TIMELINE_FORMAT = "gif"           # gif, apng or mp4 (mp4 requires ffmpeg)
+TIMELINE_WIDTH = 1014             # Frames are downscaled to this width
+TIMELINE_FRAME_DURATION = 500     # Milliseconds per frame
+TIMELINE_LABELS = True            # Draw the date in the top-left corner
+TIMELINE_PNG_COMPRESS_LEVEL = 6
+
+# Comparison settings
+COMPARE_MODE = "side_by_side"     # side_by_side or swipe
+COMPARE_CHANGE_OVERLAY = True     # Tint changed pixels red on the "after" image
+COMPARE_DECODE_CACHE_SIZE = 16    # Decoded images kept per worker process
+
+# Local imagery server settings
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+SERVER_CACHE_BYTES = 256 * 1024 * 1024  # In-memory LRU budget for encoded tiles
+SERVER_MAX_AGE = 3600                   # Cache-Control max-age in seconds
+
+
+# Co-registration settings (phase correlation against a per-section reference)
+COREGISTER = True            # Co-register new images before change analysis in --process
+COREG_VERSION = 1            # Bump to recompute cached offsets
+COREG_BATCH_SIZE = 16        # Images per batched FFT
+COREG_DOWNSAMPLE = 2         # Correlate on images block-averaged by this factor
+COREG_MAX_SHIFT = 20         # Shifts larger than this (pixels) are treated as unreliable
+COREG_TILES = None           # (rows, cols) of tiles to also estimate local shifts, e.g. (2, 4)
+COREG_APPLY_TILES = False    # Apply per-tile shifts instead of the global shift
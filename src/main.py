@@ -9,6 +9,9 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from src.api.satellite_service import SatelliteService
 from src.config import settings
+from src.models.aoi import load_aois, sections_for_aois
+from src.api.fetch_planner import plan_from_disk, print_plan
+from src.utils.geo_helpers import generate_weekly_dates
 
 def main():
     parser = argparse.ArgumentParser(description='Satellite Imagery Fetcher for Gaza Strip')
@@ -21,6 +24,23 @@ def main():
     parser.add_argument('--sections', type=str, help='Number of sections in format "lat,lon" (e.g., "2,2")')
     parser.add_argument('--client-id', type=str, help='Client ID for Sentinel Hub OAuth')
     parser.add_argument('--client-secret', type=str, help='Client Secret for Sentinel Hub OAuth')
+    parser.add_argument('--dry-run', action='store_true', help='Print the prioritized fetch plan with estimated processing units and bytes, without fetching')
+    parser.add_argument('--budget', type=float, help='Maximum processing units to spend in this --fetch run (default: settings.FETCH_BUDGET_PU)')
+    parser.add_argument('--aoi', type=str, action='append', help='Work on an AOI loaded from GeoJSON instead of the Gaza grid (repeatable, "all" for every AOI)')
+    parser.add_argument('--aoi-dir', type=str, help='Directory containing AOI GeoJSON files (default: settings.AOI_DIR)')
+    parser.add_argument('--backfill-stats', action='store_true', help='Compute ingest stats for stored images that have none')
+    parser.add_argument('--queue', type=str, help='Path to a shared SQLite job queue (e.g. on a shared volume)')
+    parser.add_argument('--seed-queue', action='store_true', help='Seed the job queue with the section x date plan')
+    parser.add_argument('--worker', action='store_true', help='Fetch jobs from the job queue until it is drained')
+    parser.add_argument('--worker-id', type=str, help='Worker name used for leases (default: hostname-pid)')
+    parser.add_argument('--workers', type=int, help='Number of worker processes used by --process (default: all cores)')
+    parser.add_argument('--reprocess', action='store_true', help='Ignore processing state and reprocess all imagery')
+    parser.add_argument('--compare', type=str, nargs='+', metavar='DATE', help='Render before/after comparisons: "DATE_A DATE_B", or a single baseline DATE compared against every later date')
+    parser.add_argument('--compare-mode', type=str, choices=['side_by_side', 'swipe'], help='Layout used by --compare')
+    parser.add_argument('--hotspots', action='store_true', help='List the locations with the most change (dates limited by --start-date/--end-date)')
+    parser.add_argument('--bbox', type=str, help='Area for --hotspots as "min_lon,min_lat,max_lon,max_lat"')
+    parser.add_argument('--top', type=int, help='Number of hotspots listed by --hotspots (default: settings.HOTSPOT_TOP_K)')
+    parser.add_argument('--timeline', type=str, nargs='?', const=settings.TIMELINE_FORMAT, choices=['gif', 'apng', 'mp4'], help='Render a timeline animation per section (gif, apng or mp4)')
     
     args = parser.parse_args()
     
@@ -44,32 +64,113 @@ def main():
         settings.CLIENT_ID = args.client_id
     if args.client_secret:
         settings.CLIENT_SECRET = args.client_secret
+    if args.compare:
+        try:
+            for date in args.compare:
+                datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            print("Invalid --compare date format. Use YYYY-MM-DD")
+            return
+    if (args.seed_queue or args.worker) and not args.queue:
+        print("--seed-queue and --worker require --queue PATH")
+        return
+    bbox = None
+    if args.bbox:
+        try:
+            bbox = [float(value) for value in args.bbox.split(',')]
+            if len(bbox) != 4:
+                raise ValueError
+        except ValueError:
+            print("Invalid bbox format. Use 'min_lon,min_lat,max_lon,max_lat'")
+            return
+    
+    project_dir = str(Path(__file__).parent.parent)
+    
+    # Select the AOIs to work on, if any
+    aois = None
+    if args.aoi:
+        aoi_dir = args.aoi_dir or os.path.join(project_dir, settings.AOI_DIR)
+        aois = load_aois(aoi_dir, names=None if 'all' in args.aoi else args.aoi)
+        if not aois:
+            print(f"No AOIs found in {aoi_dir}")
+            return
+        if bbox is None:
+            # Limit --hotspots to the AOIs themselves, not the whole grid cells they touch
+            bounds = [aoi.geometry.bounds for aoi in aois.values()]
+            bbox = [min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds)]
+    
+    if args.dry_run:
+        # The plan only reads stored files, so printing it needs no credentials or network
+        dates = generate_weekly_dates(settings.START_DATE, settings.END_DATE)
+        plan_sections = sections_for_aois(aois) if aois else SatelliteService.get_sections()
+        plan = plan_from_disk(plan_sections, dates, os.path.join(project_dir, settings.DATA_DIR), SatelliteService.get_collections())
+        print_plan(plan, budget=args.budget if args.budget is not None else settings.FETCH_BUDGET_PU)
+        if not (args.process or args.timeline or args.compare or args.seed_queue or args.worker or args.backfill_stats or args.hotspots):
+            return
     
     # Initialize the satellite service
     service = SatelliteService()
     
-    if args.fetch:
-        print(f"Starting imagery fetch for Gaza Strip from {settings.START_DATE} to {settings.END_DATE if settings.END_DATE != 'current' else 'current date'}")
-        print(f"Dividing into {settings.NUM_SECTIONS_LAT}x{settings.NUM_SECTIONS_LON} sections")
-        print(f"Using Sentinel Hub API with collection: {settings.SENTINEL_DATA_COLLECTION}")
+    try:
+        # Restrict the work to the cells of the selected AOIs, if any
+        sections = None
+        section_ids = None
+        if aois:
+            sections = service.get_aoi_sections(aois)
+            section_ids = [section["id"] for section in sections]
+    
+        if args.fetch and not args.dry_run:
+            region = f"AOIs {', '.join(aois)}" if args.aoi else "Gaza Strip"
+            print(f"Starting imagery fetch for {region} from {settings.START_DATE} to {settings.END_DATE if settings.END_DATE != 'current' else 'current date'}")
+            if not args.aoi:
+                print(f"Dividing into {settings.NUM_SECTIONS_LAT}x{settings.NUM_SECTIONS_LON} sections")
+            print(f"Using Sentinel Hub API with collection: {settings.SENTINEL_DATA_COLLECTION}")
         
-        if settings.CLIENT_ID == "your-client-id-here" or settings.CLIENT_SECRET == "your-client-secret-here":
-            print("ERROR: You must set your Sentinel Hub Client ID and Client Secret in settings.py or via command-line arguments")
-            print("Get your credentials at https://www.sentinel-hub.com/")
-            return
+            if settings.CLIENT_ID == "your-client-id-here" or settings.CLIENT_SECRET == "your-client-secret-here":
+                print("ERROR: You must set your Sentinel Hub Client ID and Client Secret in settings.py or via command-line arguments")
+                print("Get your credentials at https://www.sentinel-hub.com/")
+                return
         
-        # Fetch imagery
-        all_imagery = service.fetch_imagery_for_gaza()
+            # Fetch imagery, newest and most changed first, within the budget
+            all_imagery = service.fetch_planned(service.plan_fetch(sections), budget=args.budget)
         
-        print(f"Successfully fetched {len(all_imagery)} images")
+            print(f"Successfully fetched {len(all_imagery)} images")
+    
+        if args.backfill_stats:
+            service.backfill_image_stats()
+    
+        if args.seed_queue:
+            print(f"Seeding job queue {args.queue} from {settings.START_DATE} to {settings.END_DATE}")
+            print(f"Queue status: {service.seed_job_queue(args.queue, sections)}")
+    
+        if args.worker:
+            service.run_queue_worker(args.queue, worker_id=args.worker_id)
+    
+        if args.process:
+            print("Processing imagery data...")
+            service.process_imagery(max_workers=args.workers, incremental=not args.reprocess, section_ids=section_ids)
+            print("Processing complete!")
+    
+        if args.timeline:
+            print(f"Rendering {args.timeline} timelines...")
+            service.create_timelines(fmt=args.timeline, max_workers=args.workers, section_ids=section_ids)
+    
+        if args.compare:
+            if len(args.compare) > 2:
+                print("--compare takes one baseline date or two dates")
+            else:
+                print("Rendering before/after comparisons...")
+                service.create_comparisons(*args.compare, mode=args.compare_mode, max_workers=args.workers, section_ids=section_ids)
     
-    if args.process:
-        print("Processing imagery data...")
-        service.process_imagery()
-        print("Processing complete!")
+        if args.hotspots:
+            end = args.end_date if args.end_date != 'current' else None
+            service.find_hotspots(bbox=bbox, start=args.start_date, end=end, k=args.top, section_ids=section_ids)
+    finally:
+        # Saves the collection stats and empty dates even if a fetch stopped with an error
+        service.close()
     
     # If no arguments provided, show help
-    if not (args.fetch or args.process):
+    if not (args.fetch or args.dry_run or args.process or args.timeline or args.compare or args.seed_queue or args.worker or args.backfill_stats or args.hotspots):
         parser.print_help()
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import math
+import sys
+from pathlib import Path
+
+from shapely.geometry import shape, box
+from shapely.ops import unary_union
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+
+# Tolerance, in cells, for AOI edges that lie on grid lines
+GRID_EPSILON = 1e-6
+
+class AOI:
+    def __init__(self, name, geometry, source=None):
+        """An area of interest loaded from GeoJSON (geometry in lon/lat)"""
+        self.name = name
+        self.geometry = geometry
+        self.source = source
+
+    def __repr__(self):
+        return f"AOI(name={self.name}, bounds={self.geometry.bounds})"
+
+    def sections(self, cell_lat=None, cell_lon=None):
+        """
+        Sections covering this AOI, taken from a global grid of fixed-size cells.
+        Cell ids depend only on the cell's position, so overlapping AOIs produce
+        the same ids for shared cells and share their stored imagery.
+        Sections use the same dict layout as divide_region_into_sections.
+        """
+        cell_lat = cell_lat or settings.AOI_CELL_SIZE_LAT
+        cell_lon = cell_lon or settings.AOI_CELL_SIZE_LON
+        min_lon, min_lat, max_lon, max_lat = self.geometry.bounds
+        polygonal = self.geometry.area > 0
+
+        # Edges on grid lines divide to e.g. 628.0000000001, which must not add a row or column
+        rows = range(math.floor(min_lat / cell_lat + GRID_EPSILON), math.ceil(max_lat / cell_lat - GRID_EPSILON))
+        cols = range(math.floor(min_lon / cell_lon + GRID_EPSILON), math.ceil(max_lon / cell_lon - GRID_EPSILON))
+
+        sections = []
+        for row in rows:
+            for col in cols:
+                bounds = {
+                    "min_lat": round(row * cell_lat, 6),
+                    "max_lat": round((row + 1) * cell_lat, 6),
+                    "min_lon": round(col * cell_lon, 6),
+                    "max_lon": round((col + 1) * cell_lon, 6)
+                }
+                cell = box(bounds["min_lon"], bounds["min_lat"], bounds["max_lon"], bounds["max_lat"])
+                # Cells that only touch an AOI edge cover none of it and would be fetched for nothing
+                covered = self.geometry.intersection(cell).area > 0 if polygonal else self.geometry.intersects(cell)
+                if not covered:
+                    continue
+                sections.append({
+                    "id": cell_id(row, col, cell_lat, cell_lon),
+                    "bounds": bounds,
+                    "center": {
+                        "lat": (bounds["min_lat"] + bounds["max_lat"]) / 2,
+                        "lon": (bounds["min_lon"] + bounds["max_lon"]) / 2
+                    }
+                })
+        return sections
+
+    def write_manifest(self, aois_dir):
+        """Record the AOI's section plan under data/aois/<name>/sections.json"""
+        aoi_dir = os.path.join(aois_dir, self.name)
+        os.makedirs(aoi_dir, exist_ok=True)
+        path = os.path.join(aoi_dir, "sections.json")
+        with open(path, 'w') as f:
+            json.dump({"name": self.name, "source": self.source, "bounds": self.geometry.bounds, "sections": self.sections()}, f, indent=2)
+        return path
+
+def cell_id(row, col, cell_lat, cell_lon):
+    """Global id of a grid cell; the cell size is part of the id so different grids never collide"""
+    return f"cell_{cell_lat:g}x{cell_lon:g}_{row}_{col}".replace(".", "p").replace("-", "m")
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_").lower()
+
+def load_aoi_file(path):
+    """Load one GeoJSON file (FeatureCollection, Feature or bare geometry) as an AOI"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    if data.get("type") == "FeatureCollection":
+        features = data.get("features", [])
+    elif data.get("type") == "Feature":
+        features = [data]
+    else:
+        features = [{"type": "Feature", "geometry": data, "properties": {}}]
+
+    geometries = [shape(feature["geometry"]) for feature in features if feature.get("geometry")]
+    if not geometries:
+        raise ValueError(f"No geometry found in {path}")
+
+    properties = features[0].get("properties") or {}
+    name = _slug(properties.get("name") or os.path.splitext(os.path.basename(path))[0])
+    geometry = unary_union(geometries)
+    if not geometry.is_valid:
+        geometry = geometry.buffer(0)
+    return AOI(name, geometry, source=os.path.abspath(path))
+
+def load_aois(aoi_dir, names=None):
+    """
+    Load every *.geojson / *.json AOI in a directory, optionally only the given names.
+    Returns a dict of name -> AOI.
+    """
+    aois = {}
+    if os.path.isdir(aoi_dir):
+        for file_name in sorted(os.listdir(aoi_dir)):
+            if file_name.endswith((".geojson", ".json")):
+                try:
+                    aoi = load_aoi_file(os.path.join(aoi_dir, file_name))
+                except (ValueError, KeyError, OSError) as e:
+                    print(f"Skipping AOI file {file_name}: {str(e)}")
+                    continue
+                aois[aoi.name] = aoi
+
+    if names:
+        missing = [name for name in names if name not in aois]
+        if missing:
+            print(f"Unknown AOIs: {', '.join(missing)} (available: {', '.join(aois) or 'none'})")
+        aois = {name: aoi for name, aoi in aois.items() if name in names}
+
+    print(f"Loaded {len(aois)} AOIs from {aoi_dir}")
+    return aois
+
+def sections_for_aois(aois):
+    """Union of the section plans of several AOIs, each shared cell listed once"""
+    sections = {}
+    for aoi in aois.values():
+        for section in aoi.sections():
+            sections.setdefault(section["id"], section)
+    return list(sections.values())
@@ -0,0 +1,80 @@
+import os
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.utils.image_stats import hamming_distances
+
+class ImageryCatalog:
+    def __init__(self, metadata_dir):
+        """
+        In-memory view of the stored image metadata, including the stats
+        computed at ingest. Selection, ranking and deduplication run on the
+        metadata alone, without decoding any image.
+        """
+        self.metadata_dir = metadata_dir
+        self.records = []
+
+        if os.path.isdir(metadata_dir):
+            for name in sorted(os.listdir(metadata_dir)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(metadata_dir, name), 'r') as f:
+                        self.records.append(json.load(f))
+                except (ValueError, OSError) as e:
+                    print(f"Skipping unreadable metadata {name}: {str(e)}")
+
+    def with_stats(self, section_id=None):
+        """Records that carry ingest stats, optionally for one section, in date order"""
+        records = [r for r in self.records if r.get("stats") and (section_id is None or r.get("section_id") == section_id)]
+        return sorted(records, key=lambda r: (r["section_id"], r["timestamp"]))
+
+    @staticmethod
+    def quality_score(record):
+        """Higher is better: clear, valid pixels with reasonable contrast"""
+        stats = record["stats"]
+        clear = max(0.0, 1.0 - stats["cloud_fraction"] - stats["nodata_fraction"])
+        contrast = min(1.0, sum(stats["band_std"]) / len(stats["band_std"]) / 64.0)
+        return clear * (0.5 + 0.5 * contrast)
+
+    def rank(self, section_id=None):
+        """Records sorted from best to worst quality"""
+        return sorted(self.with_stats(section_id), key=self.quality_score, reverse=True)
+
+    def best_per_section_month(self):
+        """The clearest image for every (section_id, YYYY-MM)"""
+        best = {}
+        for record in self.with_stats():
+            key = (record["section_id"], record["timestamp"][:7])
+            if key not in best or self.quality_score(record) > self.quality_score(best[key]):
+                best[key] = record
+        return best
+
+    def cloudy(self, min_fraction=0.5, section_id=None):
+        """Records whose estimated cloud fraction is at least min_fraction"""
+        return [r for r in self.with_stats(section_id) if r["stats"]["cloud_fraction"] >= min_fraction]
+
+    def duplicates(self, max_distance=4):
+        """
+        Pairs of consecutive images of a section whose perceptual hashes are
+        within max_distance bits, i.e. the same acquisition served for two dates.
+        """
+        pairs = []
+        by_section = {}
+        for record in self.with_stats():
+            by_section.setdefault(record["section_id"], []).append(record)
+
+        for records in by_section.values():
+            if len(records) < 2:
+                continue
+            hashes = [r["stats"]["phash"] for r in records]
+            distances = hamming_distances(hashes[:-1], hashes[1:])
+            for i in np.nonzero(distances <= max_distance)[0]:
+                pairs.append((records[i], records[i + 1]))
+        return pairs
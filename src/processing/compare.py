@@ -0,0 +1,142 @@
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.utils.image_io import list_section_images, list_sections
+from src.processing.scheduler import ProcessingScheduler
+from src.processing.state import file_fingerprint
+
+COMPARISON_MODES = ("side_by_side", "swipe")
+
+@lru_cache(maxsize=settings.COMPARE_DECODE_CACHE_SIZE)
+def _decode(path, fingerprint):
+    """Decode an image once per worker process; the fingerprint invalidates rewritten files"""
+    with Image.open(path) as img:
+        array = np.asarray(img.convert("RGB"))
+    array.setflags(write=False)
+    return array
+
+def decode_image(path):
+    """Return the decoded RGB array for an image, served from the in-process LRU cache"""
+    return _decode(path, file_fingerprint(path))
+
+def change_mask(before, after, threshold=None):
+    """Boolean mask of pixels whose grayscale value changed by more than the threshold"""
+    threshold = settings.CHANGE_THRESHOLD if threshold is None else threshold
+    weights = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return np.abs(after.astype(np.float32) @ weights - before.astype(np.float32) @ weights) > threshold
+
+def render_comparison(before, after, mode="side_by_side", overlay=True, labels=None):
+    """
+    Build a before/after comparison image from two RGB arrays.
+    side_by_side places the images next to each other, swipe shows the left
+    half of the before image and the right half of the after image.
+    With overlay=True, changed pixels are tinted red on the after image.
+    """
+    if before.shape != after.shape:
+        after = np.asarray(Image.fromarray(after).resize((before.shape[1], before.shape[0]), Image.BILINEAR))
+
+    if overlay:
+        mask = change_mask(before, after)
+        after = after.copy()
+        after[mask] = (after[mask] * 0.4 + np.array([255, 0, 0]) * 0.6).astype(np.uint8)
+
+    width = before.shape[1]
+    if mode == "side_by_side":
+        canvas = np.concatenate([before, after], axis=1)
+        label_positions = (4, width + 4)
+    elif mode == "swipe":
+        canvas = np.concatenate([before[:, :width // 2], after[:, width // 2:]], axis=1)
+        canvas[:, width // 2 - 1:width // 2 + 1] = 255
+        label_positions = (4, width // 2 + 4)
+    else:
+        raise ValueError(f"Unsupported comparison mode: {mode}")
+
+    image = Image.fromarray(canvas)
+    if labels:
+        draw = ImageDraw.Draw(image)
+        for x, label in zip(label_positions, labels):
+            draw.rectangle([x - 4, 0, x + 80, 16], fill=(0, 0, 0))
+            draw.text((x, 3), label, fill=(255, 255, 255))
+    return image
+
+def _nearest_image(images, date):
+    """Pick the stored image closest to the requested date"""
+    if not images:
+        return None
+    dates = [d for d, _ in images]
+    if date in dates:
+        return images[dates.index(date)]
+    target = np.datetime64(date)
+    return min(images, key=lambda item: abs(np.datetime64(item[0]) - target))
+
+def plan_comparisons(images_dir, date_a, date_b=None, section_ids=None):
+    """
+    Resolve comparison pairs for every section.
+    With date_b, each section compares the images nearest to date_a and date_b.
+    Without it, date_a is the baseline and is compared against every later date.
+    Returns a list of (section_id, (date, path), (date, path)).
+    """
+    pairs = []
+    for section_id in section_ids or list_sections(images_dir):
+        images = list_section_images(os.path.join(images_dir, section_id))
+        baseline = _nearest_image(images, date_a)
+        if baseline is None:
+            continue
+
+        if date_b:
+            targets = [_nearest_image(images, date_b)]
+        else:
+            targets = [item for item in images if item[0] > baseline[0]]
+
+        pairs.extend((section_id, baseline, target) for target in targets if target[0] != baseline[0])
+    return pairs
+
+def render_comparison_task(task):
+    """Worker entry point: render a batch of comparisons for one section"""
+    section_out = os.path.join(task["output_dir"], task["section_id"])
+    os.makedirs(section_out, exist_ok=True)
+
+    outputs = []
+    for (date_a, path_a), (date_b, path_b) in task["pairs"]:
+        image = render_comparison(decode_image(path_a), decode_image(path_b), mode=task["mode"], overlay=task["overlay"], labels=(date_a, date_b))
+        output_path = os.path.join(section_out, f"compare_{date_a}_{date_b}.png")
+        image.save(output_path)
+        outputs.append(output_path)
+
+    return {"section_id": task["section_id"], "outputs": outputs, "cache": _decode.cache_info()._asdict()}
+
+def render_comparisons(images_dir, output_dir, date_a, date_b=None, mode=None, overlay=None, max_workers=None, section_ids=None):
+    """
+    Render comparisons for all sections on a worker pool.
+    Pairs are batched per section so that a baseline stays in the worker's
+    decode cache and is decoded once rather than once per pair.
+    """
+    mode = mode or settings.COMPARE_MODE
+    overlay = settings.COMPARE_CHANGE_OVERLAY if overlay is None else overlay
+
+    by_section = {}
+    for section_id, before, after in plan_comparisons(images_dir, date_a, date_b, section_ids=section_ids):
+        by_section.setdefault(section_id, []).append((before, after))
+
+    tasks = []
+    for section_id, pairs in by_section.items():
+        for start in range(0, len(pairs), settings.PROCESS_CHUNK_SIZE):
+            tasks.append({
+                "section_id": section_id,
+                "pairs": pairs[start:start + settings.PROCESS_CHUNK_SIZE],
+                "mode": mode,
+                "overlay": overlay,
+                "output_dir": output_dir
+            })
+
+    print(f"Rendering {sum(len(p) for p in by_section.values())} comparisons in {len(tasks)} tasks")
+    return ProcessingScheduler(worker=render_comparison_task, max_workers=max_workers).run(tasks)
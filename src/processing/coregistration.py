@@ -0,0 +1,263 @@
+import os
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.models.imagery_catalog import ImageryCatalog
+from src.utils.image_io import list_section_images, list_sections, load_image_array
+
+def _prepare(stack):
+    """Remove the mean and apply a Hann window so image borders do not dominate the correlation"""
+    stack = stack - stack.mean(axis=(-2, -1), keepdims=True)
+    window = np.outer(np.hanning(stack.shape[-2]), np.hanning(stack.shape[-1])).astype(np.float32)
+    return stack * window
+
+def _downsample(array, factor):
+    """Block-average the last two axes by an integer factor"""
+    if factor <= 1:
+        return array
+    height = array.shape[-2] // factor * factor
+    width = array.shape[-1] // factor * factor
+    array = array[..., :height, :width]
+    shape = array.shape[:-2] + (height // factor, factor, width // factor, factor)
+    return array.reshape(shape).mean(axis=(-3, -1))
+
+def phase_correlation(reference_fft, stack):
+    """
+    Estimate the (dy, dx) translation of every image in a (N, H, W) stack
+    relative to the reference, whose windowed rfft2 is passed in.
+    All images are transformed in one batched FFT call. The returned shift d
+    satisfies image(y, x) ~ reference(y - dy, x - dx), with sub-pixel
+    precision from the peak's neighbouring correlation values.
+    Also returns the normalised peak height as a confidence measure.
+    """
+    height, width = stack.shape[-2:]
+    spectra = np.fft.rfft2(_prepare(stack))
+    cross = spectra * np.conj(reference_fft)
+    cross /= np.maximum(np.abs(cross), 1e-12)
+    surface = np.fft.irfft2(cross, s=(height, width))
+
+    flat_peaks = surface.reshape(len(stack), -1).argmax(axis=1)
+    peak_y, peak_x = np.unravel_index(flat_peaks, (height, width))
+    index = np.arange(len(stack))
+
+    def refine(center, before, after):
+        # Foroosh et al.: for a phase correlation peak, the neighbour on the side of the true
+        # peak relates to the peak height like a sampled sinc, giving the fractional offset
+        use_after = after >= before
+        side = np.maximum(np.where(use_after, after, before), 0)
+        offset = side / np.maximum(side + center, 1e-12)
+        return np.where(use_after, offset, -offset)
+
+    center = surface[index, peak_y, peak_x]
+    dy = peak_y + refine(center, surface[index, (peak_y - 1) % height, peak_x], surface[index, (peak_y + 1) % height, peak_x])
+    dx = peak_x + refine(center, surface[index, peak_y, (peak_x - 1) % width], surface[index, peak_y, (peak_x + 1) % width])
+
+    # Peaks past the middle are negative shifts
+    dy = np.where(dy > height / 2, dy - height, dy)
+    dx = np.where(dx > width / 2, dx - width, dx)
+    return dy, dx, center
+
+def _tile_slices(height, width, tiles):
+    rows, cols = tiles
+    for r in range(rows):
+        for c in range(cols):
+            yield r, c, (r * height // rows, (r + 1) * height // rows, c * width // cols, (c + 1) * width // cols)
+
+def register_images(reference_path, image_paths, tiles=None, batch_size=None, max_shift=None, downsample=None):
+    """
+    Estimate the translation of each image against the reference.
+    Images are processed in batches so memory is bounded by batch_size frames.
+    Correlation runs on images block-averaged by the downsample factor, and
+    shifts are scaled back to full-resolution pixels.
+    With tiles=(rows, cols), a shift is also estimated per tile for local misalignment.
+    """
+    batch_size = batch_size or settings.COREG_BATCH_SIZE
+    max_shift = settings.COREG_MAX_SHIFT if max_shift is None else max_shift
+    factor = downsample or settings.COREG_DOWNSAMPLE
+
+    reference = _downsample(load_image_array(reference_path), factor)
+    height, width = reference.shape
+    reference_fft = np.fft.rfft2(_prepare(reference[None]))[0]
+    tile_ffts = []
+    if tiles:
+        for _, _, (y0, y1, x0, x1) in _tile_slices(height, width, tiles):
+            tile_ffts.append(((y0, y1, x0, x1), np.fft.rfft2(_prepare(reference[None, y0:y1, x0:x1]))[0]))
+
+    registrations = []
+    for start in range(0, len(image_paths), batch_size):
+        paths = image_paths[start:start + batch_size]
+        stack = np.stack([_downsample(load_image_array(path), factor) for path in paths])
+        if stack.shape[1:] != reference.shape:
+            raise ValueError(f"Image size {stack.shape[1:]} does not match reference {reference.shape}")
+
+        dy, dx, peak = phase_correlation(reference_fft, stack)
+        dy, dx = dy * factor, dx * factor
+        tile_shifts = []
+        for (y0, y1, x0, x1), tile_fft in tile_ffts:
+            tdy, tdx, tile_peak = phase_correlation(tile_fft, stack[:, y0:y1, x0:x1])
+            tile_shifts.append((tdy * factor, tdx * factor, tile_peak))
+
+        for i in range(len(paths)):
+            reliable = bool(abs(dy[i]) <= max_shift and abs(dx[i]) <= max_shift)
+            registration = {
+                "dy": round(float(dy[i]), 3) if reliable else 0.0,
+                "dx": round(float(dx[i]), 3) if reliable else 0.0,
+                "peak": round(float(peak[i]), 4),
+                "reliable": reliable
+            }
+            if tiles:
+                registration["tiles"] = [
+                    [round(float(tdy[i]), 3), round(float(tdx[i]), 3)]
+                    if abs(tdy[i]) <= max_shift and abs(tdx[i]) <= max_shift else [registration["dy"], registration["dx"]]
+                    for tdy, tdx, _ in tile_shifts
+                ]
+                registration["tile_grid"] = list(tiles)
+            registrations.append(registration)
+
+    return registrations
+
+def _sample(array, sy, sx, y0, y1, x0, x1):
+    """Bilinear sample of array[y + sy, x + sx] over a region, clamping at the borders"""
+    height, width = array.shape[:2]
+    ys = np.arange(y0, y1) + sy
+    xs = np.arange(x0, x1) + sx
+    y_floor = np.floor(ys).astype(np.int64)
+    x_floor = np.floor(xs).astype(np.int64)
+    wy = (ys - y_floor).astype(np.float32)[:, None]
+    wx = (xs - x_floor).astype(np.float32)[None, :]
+    if array.ndim == 3:
+        wy = wy[..., None]
+        wx = wx[..., None]
+
+    y_a = np.clip(y_floor, 0, height - 1)
+    y_b = np.clip(y_floor + 1, 0, height - 1)
+    x_a = np.clip(x_floor, 0, width - 1)
+    x_b = np.clip(x_floor + 1, 0, width - 1)
+
+    top = array[y_a][:, x_a] * (1 - wx) + array[y_a][:, x_b] * wx
+    bottom = array[y_b][:, x_a] * (1 - wx) + array[y_b][:, x_b] * wx
+    return top * (1 - wy) + bottom * wy
+
+def apply_registration(array, registration):
+    """
+    Resample an image so it lines up with its section reference.
+    Per-tile shifts are used when present and COREG_APPLY_TILES is enabled.
+    """
+    if not registration:
+        return array
+
+    height, width = array.shape[:2]
+    tiles = registration.get("tiles")
+    if tiles and settings.COREG_APPLY_TILES:
+        result = np.empty(array.shape, dtype=np.float32)
+        for (r, c, (y0, y1, x0, x1)), (dy, dx) in zip(_tile_slices(height, width, registration["tile_grid"]), tiles):
+            result[y0:y1, x0:x1] = _sample(array, dy, dx, y0, y1, x0, x1)
+        return result
+
+    if registration["dy"] == 0 and registration["dx"] == 0:
+        return array
+    return _sample(array, registration["dy"], registration["dx"], 0, height, 0, width)
+
+def _metadata_path(metadata_dir, section_id, date):
+    return os.path.join(metadata_dir, f"{section_id}_{date}.json")
+
+def load_registrations(metadata_dir, section_id):
+    """Return the cached registration of every date of a section, keyed by date"""
+    registrations = {}
+    prefix = f"{section_id}_"
+    if not os.path.isdir(metadata_dir):
+        return registrations
+    for name in os.listdir(metadata_dir):
+        if name.startswith(prefix) and name.endswith(".json") and len(name) == len(prefix) + 15:
+            try:
+                with open(os.path.join(metadata_dir, name), 'r') as f:
+                    registration = json.load(f).get("registration")
+            except (ValueError, OSError):
+                continue
+            if registration:
+                registrations[name[len(prefix):-5]] = registration
+    return registrations
+
+def save_registration(metadata_dir, section_id, date, local_path, registration):
+    """Store a registration in the image metadata, creating a minimal record if none exists"""
+    path = _metadata_path(metadata_dir, section_id, date)
+    metadata = {"timestamp": date, "section_id": section_id, "local_path": local_path}
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            metadata = json.load(f)
+    metadata["registration"] = registration
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+
+def choose_reference(images, catalog, section_id, existing):
+    """
+    Keep the reference already used by the cached registrations if it still exists,
+    otherwise take the highest-quality image according to the ingest stats.
+    """
+    dates = {date for date, _ in images}
+    current = {r.get("reference") for r in existing.values()} & dates
+    if len(current) == 1:
+        return current.pop()
+
+    ranked = [r["timestamp"] for r in catalog.rank(section_id) if r["timestamp"] in dates]
+    return ranked[0] if ranked else images[0][0]
+
+def coregister_section_task(task):
+    """Worker entry point: register the pending images of one section"""
+    registrations = register_images(task["reference_path"], [path for _, path in task["images"]], tiles=task.get("tiles"))
+    return {
+        "section_id": task["section_id"],
+        "reference": task["reference"],
+        "registrations": [(date, path, registration) for (date, path), registration in zip(task["images"], registrations)]
+    }
+
+def coregister_sections(images_dir, metadata_dir, max_workers=None, section_ids=None, tiles=None):
+    """
+    Co-register every section against its reference image, one task per section.
+    Only images without a cached registration for the current reference and
+    COREG_VERSION are computed; results are written to the image metadata.
+    """
+    # Imported here because the scheduler itself imports this module to apply registrations
+    from src.processing.scheduler import ProcessingScheduler
+
+    tiles = tiles or settings.COREG_TILES
+    catalog = ImageryCatalog(metadata_dir)
+    tasks = []
+
+    for section_id in section_ids or list_sections(images_dir):
+        images = list_section_images(os.path.join(images_dir, section_id))
+        if len(images) < 2:
+            continue
+
+        existing = load_registrations(metadata_dir, section_id)
+        reference = choose_reference(images, catalog, section_id, existing)
+        pending = [
+            (date, path) for date, path in images
+            if existing.get(date, {}).get("reference") != reference or existing[date].get("version") != settings.COREG_VERSION
+        ]
+        if pending:
+            tasks.append({
+                "section_id": section_id,
+                "reference": reference,
+                "reference_path": dict(images)[reference],
+                "images": pending,
+                "tiles": tiles
+            })
+
+    print(f"Co-registering {sum(len(t['images']) for t in tasks)} images in {len(tasks)} sections")
+    results, failed = ProcessingScheduler(worker=coregister_section_task, max_workers=max_workers).run(tasks)
+
+    for result in results:
+        for date, path, registration in result["registrations"]:
+            registration.update({"reference": result["reference"], "version": settings.COREG_VERSION})
+            save_registration(metadata_dir, result["section_id"], date, path, registration)
+    return results, failed
@@ -0,0 +1,296 @@
+import os
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.utils.geo_helpers import calculate_distances
+from src.utils.image_io import list_sections
+from src.processing.state import ProcessingState, file_fingerprint
+from src.processing.scheduler import ProcessingScheduler
+
+INDEX_FILE_NAME = "hotspots.npz"
+
+def extract_hotspots(mask, bbox, cell_px=None, min_fraction=None):
+    """
+    Reduce a boolean change mask to grid cells of cell_px x cell_px pixels and
+    return the cells whose changed fraction is at least min_fraction, geo-referenced
+    with the image bbox [min_lon, min_lat, max_lon, max_lat] (row 0 is the north edge).
+    Returns a dict of columns: cell, min_lon, min_lat, max_lon, max_lat, magnitude, area_km2.
+    """
+    cell_px = cell_px or settings.HOTSPOT_CELL_PX
+    min_fraction = settings.HOTSPOT_MIN_FRACTION if min_fraction is None else min_fraction
+    height, width = mask.shape
+    rows = -(-height // cell_px)
+    cols = -(-width // cell_px)
+
+    # Pad to whole cells; padding counts neither as changed nor as valid
+    padded = np.zeros((rows * cell_px, cols * cell_px), dtype=np.float32)
+    padded[:height, :width] = mask
+    valid = np.zeros_like(padded)
+    valid[:height, :width] = 1
+    changed = padded.reshape(rows, cell_px, cols, cell_px).sum(axis=(1, 3))
+    pixels = valid.reshape(rows, cell_px, cols, cell_px).sum(axis=(1, 3))
+    fraction = changed / pixels
+
+    cell_rows, cell_cols = np.nonzero(fraction >= max(min_fraction, 1e-9))
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lon_per_px = (max_lon - min_lon) / width
+    lat_per_px = (max_lat - min_lat) / height
+
+    cell_min_lon = min_lon + cell_cols * cell_px * lon_per_px
+    cell_max_lon = min_lon + np.minimum((cell_cols + 1) * cell_px, width) * lon_per_px
+    cell_max_lat = max_lat - cell_rows * cell_px * lat_per_px
+    cell_min_lat = max_lat - np.minimum((cell_rows + 1) * cell_px, height) * lat_per_px
+
+    mid_lat = (cell_min_lat + cell_max_lat) / 2
+    width_km = calculate_distances(mid_lat, cell_min_lon, mid_lat, cell_max_lon)
+    height_km = calculate_distances(cell_min_lat, cell_min_lon, cell_max_lat, cell_min_lon)
+    magnitude = fraction[cell_rows, cell_cols]
+
+    return {
+        "cell": (cell_rows * cols + cell_cols).astype(np.int32),
+        "min_lon": cell_min_lon,
+        "min_lat": cell_min_lat,
+        "max_lon": cell_max_lon,
+        "max_lat": cell_max_lat,
+        "magnitude": magnitude.astype(np.float32),
+        "area_km2": (magnitude * width_km * height_km).astype(np.float32)
+    }
+
+def hotspot_task(task):
+    """Worker entry point: extract the hotspots of some change masks of a section"""
+    extracted = []
+    for date, mask_path, fingerprint, bbox in task["masks"]:
+        with Image.open(mask_path) as img:
+            mask = np.asarray(img.convert("L")) > 127
+        extracted.append((date, fingerprint, extract_hotspots(mask, bbox)))
+    return {"section_id": task["section_id"], "dates": extracted}
+
+class HotspotIndex:
+    def __init__(self, path):
+        """
+        Geo-referenced change hotspots of all sections and dates, stored as
+        columns in one .npz file. A grid-bucket index over the hotspot centres
+        answers bbox, date-range and top-K queries without reading any mask.
+        The source table records the mask fingerprint each (section, date)
+        was extracted from, so only new or changed masks are processed.
+        """
+        self.path = path
+        self.columns = self._empty()
+        self.sources = {}
+        self._buckets = None
+
+        if os.path.isfile(path):
+            try:
+                with np.load(path) as data:
+                    if int(data["version"]) == settings.HOTSPOT_VERSION:
+                        self.columns = {name: data[name] for name in self.columns}
+                        for section_id, date, fingerprint in zip(data["source_section"], data["source_date"], data["source_fingerprint"]):
+                            self.sources.setdefault(str(section_id), {})[str(date)] = str(fingerprint)
+            except (ValueError, KeyError, OSError) as e:
+                print(f"Ignoring unreadable hotspot index {path}: {str(e)}")
+
+    @staticmethod
+    def _empty():
+        columns = {
+            "section_id": np.array([], dtype="U64"),
+            "date": np.array([], dtype="U10"),
+            "cell": np.array([], dtype=np.int32),
+            "magnitude": np.array([], dtype=np.float32),
+            "area_km2": np.array([], dtype=np.float32)
+        }
+        for name in ("min_lon", "min_lat", "max_lon", "max_lat"):
+            columns[name] = np.array([], dtype=np.float64)
+        return columns
+
+    def __len__(self):
+        return len(self.columns["date"])
+
+    def replace(self, section_id, extracted):
+        """Replace the hotspots of some dates of a section with freshly extracted (date, fingerprint, hotspots)"""
+        if not extracted:
+            return
+        dates = [date for date, _, _ in extracted]
+        keep = ~((self.columns["section_id"] == section_id) & np.isin(self.columns["date"], dates))
+        parts = {name: [column[keep]] for name, column in self.columns.items()}
+        for date, fingerprint, hotspots in extracted:
+            count = len(hotspots["cell"])
+            new = dict(hotspots, section_id=np.full(count, section_id), date=np.full(count, date))
+            for name, column in self.columns.items():
+                parts[name].append(np.asarray(new[name]).astype(column.dtype))
+            self.sources.setdefault(section_id, {})[date] = fingerprint
+
+        self.columns = {name: np.concatenate(parts[name]) for name in self.columns}
+        self._buckets = None
+
+    def save(self):
+        """Write the index atomically"""
+        sources = [(section_id, date, fingerprint) for section_id, dates in self.sources.items() for date, fingerprint in dates.items()]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            version=settings.HOTSPOT_VERSION,
+            source_section=np.array([s for s, _, _ in sources], dtype="U64"),
+            source_date=np.array([d for _, d, _ in sources], dtype="U10"),
+            source_fingerprint=np.array([f for _, _, f in sources], dtype="U64"),
+            **self.columns
+        )
+        os.replace(tmp_path, self.path)
+
+    def _build_buckets(self):
+        """Sort rows by the grid bucket of their centre so each bucket is one contiguous slice"""
+        size = settings.HOTSPOT_INDEX_BUCKET_DEG
+        lons = (self.columns["min_lon"] + self.columns["max_lon"]) / 2
+        lats = (self.columns["min_lat"] + self.columns["max_lat"]) / 2
+        self._origin = (lats.min(), lons.min()) if len(self) else (0.0, 0.0)
+        bucket_rows = ((lats - self._origin[0]) / size).astype(np.int64)
+        bucket_cols = ((lons - self._origin[1]) / size).astype(np.int64)
+        self._bucket_cols = int(bucket_cols.max()) + 1 if len(self) else 1
+        self._bucket_rows = int(bucket_rows.max()) + 1 if len(self) else 1
+
+        keys = bucket_rows * self._bucket_cols + bucket_cols
+        self._section_codes = np.unique(self.columns["section_id"], return_inverse=True)[1].astype(np.int64).reshape(-1)
+        self._order = np.argsort(keys, kind="stable")
+        self._buckets = keys[self._order]
+        # Hotspots are indexed by centre, so queries are widened by the largest half-extent
+        self._margin = (
+            float(((self.columns["max_lat"] - self.columns["min_lat"]) / 2).max()) if len(self) else 0.0,
+            float(((self.columns["max_lon"] - self.columns["min_lon"]) / 2).max()) if len(self) else 0.0
+        )
+
+    def _candidates(self, bbox):
+        """Row indices whose bucket can intersect bbox"""
+        if self._buckets is None:
+            self._build_buckets()
+        size = settings.HOTSPOT_INDEX_BUCKET_DEG
+        min_lon, min_lat, max_lon, max_lat = bbox
+        row_from = max(int(np.floor((min_lat - self._margin[0] - self._origin[0]) / size)), 0)
+        row_to = min(int(np.floor((max_lat + self._margin[0] - self._origin[0]) / size)), self._bucket_rows - 1)
+        col_from = max(int(np.floor((min_lon - self._margin[1] - self._origin[1]) / size)), 0)
+        col_to = min(int(np.floor((max_lon + self._margin[1] - self._origin[1]) / size)), self._bucket_cols - 1)
+        if row_from > row_to or col_from > col_to:
+            return np.array([], dtype=np.int64)
+
+        # Within one bucket row the columns are consecutive keys, i.e. one slice of the sorted rows
+        starts = np.arange(row_from, row_to + 1) * self._bucket_cols
+        lo = np.searchsorted(self._buckets, starts + col_from, side="left")
+        hi = np.searchsorted(self._buckets, starts + col_to, side="right")
+        return np.concatenate([self._order[a:b] for a, b in zip(lo, hi)] or [np.array([], dtype=np.int64)])
+
+    def _select(self, bbox=None, start=None, end=None, min_magnitude=0.0, section_ids=None):
+        """Row indices of the hotspots matching a query"""
+        rows = self._candidates(bbox) if bbox is not None else np.arange(len(self))
+        columns = self.columns
+        mask = columns["magnitude"][rows] >= min_magnitude
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            mask &= (
+                (columns["max_lon"][rows] >= min_lon) & (columns["min_lon"][rows] <= max_lon)
+                & (columns["max_lat"][rows] >= min_lat) & (columns["min_lat"][rows] <= max_lat)
+            )
+        if start:
+            mask &= columns["date"][rows] >= start
+        if end:
+            mask &= columns["date"][rows] <= end
+        if section_ids is not None:
+            mask &= np.isin(columns["section_id"][rows], list(section_ids))
+        return rows[mask]
+
+    def query(self, bbox=None, start=None, end=None, min_magnitude=0.0, section_ids=None):
+        """
+        Hotspots intersecting bbox [min_lon, min_lat, max_lon, max_lat] within an
+        inclusive date range, optionally of some sections only, as a dict of columns.
+        """
+        rows = self._select(bbox, start, end, min_magnitude, section_ids)
+        return {name: column[rows] for name, column in self.columns.items()}
+
+    def top_k(self, k=None, bbox=None, start=None, end=None, section_ids=None):
+        """
+        The k locations with the largest changed area summed over the date range,
+        one entry per (section, cell), largest first.
+        """
+        k = k or settings.HOTSPOT_TOP_K
+        rows = self._select(bbox, start, end, section_ids=section_ids)
+        if not len(rows):
+            return []
+
+        # Group by integer (section, cell) keys; string keys would be much slower to sort
+        if self._buckets is None:
+            self._build_buckets()
+        keys = self._section_codes[rows] * (int(self.columns["cell"].max()) + 1) + self.columns["cell"][rows]
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        total_area = np.bincount(inverse, weights=self.columns["area_km2"][rows], minlength=len(unique))
+
+        results = []
+        for group in np.argsort(-total_area, kind="stable")[:k]:
+            row = rows[first[group]]
+            members = rows[inverse == group]
+            group_dates = np.sort(self.columns["date"][members])
+            results.append({
+                "section_id": str(self.columns["section_id"][row]),
+                "cell": int(self.columns["cell"][row]),
+                "bbox": [float(self.columns[name][row]) for name in ("min_lon", "min_lat", "max_lon", "max_lat")],
+                "area_km2": float(total_area[group]),
+                "max_magnitude": float(self.columns["magnitude"][members].max()),
+                "dates": len(members),
+                "first_date": str(group_dates[0]),
+                "last_date": str(group_dates[-1])
+            })
+        return results
+
+def _section_bbox(metadata_dir, section_id, date):
+    """Bounding box of a stored image from its metadata, or None"""
+    path = os.path.join(metadata_dir, f"{section_id}_{date}.json")
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("bbox")
+    except (ValueError, OSError):
+        return None
+
+def update_hotspots(processed_dir, metadata_dir, max_workers=None, section_ids=None, incremental=True):
+    """
+    Extract hotspots from change masks that are new or changed since the last
+    run and update processed/hotspots.npz. Masks are found through each
+    section's processing state and geo-referenced with the image metadata bbox.
+    """
+    index = HotspotIndex(os.path.join(processed_dir, INDEX_FILE_NAME))
+    tasks = []
+
+    for section_id in section_ids or list_sections(processed_dir):
+        state = ProcessingState(processed_dir, section_id)
+        known = index.sources.get(section_id, {}) if incremental else {}
+        pending = []
+        for date in sorted(state.dates):
+            mask_path = state.dates[date].get("result", {}).get("change_mask")
+            if not mask_path or not os.path.isfile(mask_path):
+                continue
+            fingerprint = f"{file_fingerprint(mask_path)}:{settings.HOTSPOT_CELL_PX}:{settings.HOTSPOT_MIN_FRACTION}"
+            if known.get(date) == fingerprint:
+                continue
+            bbox = _section_bbox(metadata_dir, section_id, date)
+            if bbox is None:
+                print(f"No bbox in metadata for {section_id} on {date}, skipping its hotspots")
+                continue
+            pending.append((date, mask_path, fingerprint, bbox))
+
+        for offset in range(0, len(pending), settings.PROCESS_CHUNK_SIZE):
+            tasks.append({"section_id": section_id, "masks": pending[offset:offset + settings.PROCESS_CHUNK_SIZE]})
+
+    if not tasks:
+        return index, []
+
+    print(f"Extracting hotspots from {sum(len(t['masks']) for t in tasks)} change masks")
+    results, failed = ProcessingScheduler(worker=hotspot_task, max_workers=max_workers).run(tasks)
+    for result in results:
+        index.replace(result["section_id"], result["dates"])
+    index.save()
+    print(f"Hotspot index has {len(index)} hotspots ({len(failed)} failed tasks)")
+    return index, failed
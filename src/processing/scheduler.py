@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.utils.image_io import list_section_images, list_sections, load_image_array
+from src.processing.state import ProcessingState, file_fingerprint
+from src.processing.coregistration import apply_registration, load_registrations
+
+def plan_processing_tasks(images_dir, output_dir, chunk_size=None, section_ids=None, incremental=True, metadata_dir=None):
+    """
+    Split the stored imagery into (section, date-range) chunks.
+    Each task only carries file paths so workers decode images themselves
+    instead of receiving pickled arrays from the parent process.
+    With incremental=True, dates whose outputs are current for the stored
+    inputs and PROCESSING_VERSION are skipped.
+    If metadata_dir is given, cached co-registration offsets are passed along
+    and applied by the workers when the images are decoded.
+    """
+    chunk_size = chunk_size or settings.PROCESS_CHUNK_SIZE
+    tasks = []
+
+    for section_id in section_ids or list_sections(images_dir):
+        images = list_section_images(os.path.join(images_dir, section_id))
+        registrations = load_registrations(metadata_dir, section_id) if metadata_dir else {}
+        # A changed registration changes the aligned input, so it is part of the fingerprint
+        fingerprints = [
+            file_fingerprint(path) + (f":{registrations[date]['dy']},{registrations[date]['dx']}" if date in registrations else "")
+            for date, path in images
+        ]
+        state = ProcessingState(output_dir, section_id) if incremental else None
+
+        # Indices of dates that need (re)processing
+        stale = []
+        for i, (date, _) in enumerate(images):
+            previous_fingerprint = fingerprints[i - 1] if i > 0 else None
+            if state is None or not state.is_current(date, settings.PROCESSING_VERSION, fingerprints[i], previous_fingerprint):
+                stale.append(i)
+
+        # Chunk contiguous runs of stale dates so each chunk diffs against its predecessor
+        for run in _contiguous_runs(stale):
+            for offset in range(0, len(run), chunk_size):
+                start = run[offset]
+                end = run[min(offset + chunk_size, len(run)) - 1] + 1
+                tasks.append({
+                    "section_id": section_id,
+                    "images": images[start:end],
+                    # Last image before the chunk, so the first date can still be diffed
+                    "previous_path": images[start - 1][1] if start > 0 else None,
+                    "fingerprints": {images[i][0]: (fingerprints[i], fingerprints[i - 1] if i > 0 else None) for i in range(start, end)},
+                    "registrations": {images[i][0]: registrations[images[i][0]] for i in range(max(start - 1, 0), end) if images[i][0] in registrations},
+                    "output_dir": output_dir
+                })
+
+    return tasks
+
+def _contiguous_runs(indices):
+    """Group a sorted list of indices into runs of consecutive values"""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][-1] == index - 1:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
+
+def process_chunk(task):
+    """
+    Worker entry point: decode each image of the chunk, diff it against the
+    previous date and write a change mask next to the processed outputs.
+    Returns a small per-date summary; large arrays never leave the worker.
+    """
+    section_out = os.path.join(task["output_dir"], task["section_id"])
+    os.makedirs(section_out, exist_ok=True)
+
+    registrations = task.get("registrations", {})
+    previous = None
+    if task.get("previous_path"):
+        previous_date = os.path.splitext(os.path.basename(task["previous_path"]))[0]
+        previous = apply_registration(load_image_array(task["previous_path"]), registrations.get(previous_date))
+    dates = []
+
+    for date, path in task["images"]:
+        current = apply_registration(load_image_array(path), registrations.get(date))
+        entry = {
+            "date": date,
+            "mean": float(current.mean()),
+            "std": float(current.std())
+        }
+
+        if previous is not None and previous.shape == current.shape:
+            diff = np.abs(current - previous)
+            mask = diff > settings.CHANGE_THRESHOLD
+            mask_path = os.path.join(section_out, f"{date}_change.png")
+            Image.fromarray(mask.astype(np.uint8) * 255).save(mask_path)
+            entry["mean_change"] = float(diff.mean())
+            entry["changed_fraction"] = float(mask.mean())
+            entry["change_mask"] = mask_path
+
+        dates.append(entry)
+        previous = current
+
+    return {"section_id": task["section_id"], "dates": dates, "fingerprints": task.get("fingerprints", {})}
+
+class ProcessingScheduler:
+    def __init__(self, worker=process_chunk, max_workers=None, max_in_flight=None, max_retries=None):
+        """
+        Fan processing tasks out over a process pool.
+        max_in_flight bounds how many tasks are submitted at once, which keeps
+        the memory held by queued work constant regardless of archive size.
+        """
+        self.worker = worker
+        self.max_workers = max_workers or settings.PROCESS_WORKERS or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or settings.PROCESS_MAX_IN_FLIGHT or self.max_workers * 2
+        self.max_retries = settings.PROCESS_MAX_RETRIES if max_retries is None else max_retries
+
+    def run(self, tasks):
+        """Run all tasks and return the list of worker results plus the failed tasks"""
+        results = []
+        failed = []
+        pending = {}
+        task_iter = iter(tasks)
+        exhausted = False
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # Keep the pool fed without queueing the whole plan up front
+                while not exhausted and len(pending) < self.max_in_flight:
+                    try:
+                        task = next(task_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(self.worker, task)] = (task, 0)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, attempt = pending.pop(future)
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        if attempt < self.max_retries:
+                            print(f"Task for {task.get('section_id')} failed ({str(e)}), retrying ({attempt + 1}/{self.max_retries})")
+                            pending[executor.submit(self.worker, task)] = (task, attempt + 1)
+                        else:
+                            print(f"Task for {task.get('section_id')} failed after {attempt + 1} attempts: {str(e)}")
+                            failed.append({"task": task, "error": str(e)})
+
+        return results, failed
+
+def summarize_results(results, failed=None, elapsed=None):
+    """Aggregate per-chunk worker results into a per-section summary"""
+    sections = {}
+
+    for result in results:
+        section = sections.setdefault(result["section_id"], {"images": 0, "compared": 0, "max_change": 0.0, "max_change_date": None})
+        for entry in result["dates"]:
+            section["images"] += 1
+            if "changed_fraction" in entry:
+                section["compared"] += 1
+                if entry["changed_fraction"] >= section["max_change"]:
+                    section["max_change"] = entry["changed_fraction"]
+                    section["max_change_date"] = entry["date"]
+
+    return {
+        "sections": sections,
+        "images": sum(s["images"] for s in sections.values()),
+        "failed_tasks": len(failed or []),
+        "elapsed_seconds": elapsed
+    }
+
+def record_results(output_dir, results):
+    """Update the per-section processing state with successful worker results"""
+    by_section = {}
+    for result in results:
+        by_section.setdefault(result["section_id"], []).append(result)
+
+    for section_id, section_results in by_section.items():
+        state = ProcessingState(output_dir, section_id)
+        for result in section_results:
+            for entry in result["dates"]:
+                fingerprint, previous_fingerprint = result["fingerprints"].get(entry["date"], (None, None))
+                state.record(entry["date"], settings.PROCESSING_VERSION, fingerprint, previous_fingerprint, entry)
+        state.save()
+
+def run_processing(images_dir, output_dir, max_workers=None, section_ids=None, incremental=True, metadata_dir=None):
+    """Plan, execute and summarize a processing run over the image archive"""
+    start = time.time()
+    tasks = plan_processing_tasks(images_dir, output_dir, section_ids=section_ids, incremental=incremental, metadata_dir=metadata_dir)
+    print(f"Planned {len(tasks)} processing tasks ({sum(len(t['images']) for t in tasks)} images to process)")
+
+    scheduler = ProcessingScheduler(max_workers=max_workers)
+    print(f"Running with {scheduler.max_workers} workers (max {scheduler.max_in_flight} tasks in flight)")
+    results, failed = scheduler.run(tasks)
+    record_results(output_dir, results)
+
+    return summarize_results(results, failed, elapsed=time.time() - start)
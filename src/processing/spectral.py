@@ -0,0 +1,230 @@
+import os
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.utils.image_io import list_section_images, list_sections
+from src.processing.state import file_fingerprint
+from src.processing.scheduler import ProcessingScheduler
+from src.processing.coregistration import apply_registration, load_registrations
+
+# Channel order of the stored band images, as written by SPECTRAL_EVALSCRIPT
+BAND_ORDER = ("B04", "B08", "B11", "B12")
+
+# Normalized differences (a - b) / (a + b)
+INDICES = {
+    "ndvi": ("B08", "B04"),   # Vegetation
+    "ndbi": ("B11", "B08"),   # Built-up surfaces
+    "nbr": ("B08", "B12")     # Burned areas
+}
+
+INDEX_STATS = ("mean", "std", "p10", "p50", "p90", "valid_fraction")
+SERIES_FILE_NAME = "spectral_timeseries.npz"
+BANDS_DIR_NAME = "bands"
+
+def bands_dir(images_dir, section_id):
+    """Band images of a section live next to its RGB images, in a bands/ subdirectory"""
+    return os.path.join(images_dir, section_id, BANDS_DIR_NAME)
+
+def load_bands(path):
+    """
+    Decode a stored band image into a (4, H, W) float32 array in BAND_ORDER.
+    Pixels where every band is zero are no-data.
+    """
+    with Image.open(path) as img:
+        array = np.asarray(img.convert("RGBA"), dtype=np.float32)
+    return np.moveaxis(array, -1, 0)
+
+def compute_indices(bands):
+    """
+    Compute every index in INDICES at once from a (4, H, W) band stack.
+    Returns a (len(INDICES), H, W) float32 array with NaN where an index is undefined.
+    """
+    positions = {name: i for i, name in enumerate(BAND_ORDER)}
+    a = bands[[positions[first] for first, _ in INDICES.values()]]
+    b = bands[[positions[second] for _, second in INDICES.values()]]
+    total = a + b
+    valid = (total > 0) & bands.any(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid, (a - b) / total, np.nan).astype(np.float32)
+
+def summarize_indices(indices):
+    """Per-index summary statistics as a (len(INDICES), len(INDEX_STATS)) array"""
+    flat = indices.reshape(len(indices), -1)
+    valid = ~np.isnan(flat)
+    summary = np.full((len(flat), len(INDEX_STATS)), np.nan, dtype=np.float32)
+    summary[:, 5] = valid.mean(axis=1)
+    if valid.any():
+        # An index with no valid pixel at all stays NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            summary[:, 0] = np.nanmean(flat, axis=1)
+            summary[:, 1] = np.nanstd(flat, axis=1)
+            summary[:, 2:5] = np.nanpercentile(flat, [10, 50, 90], axis=1).T
+    return summary
+
+def spectral_task(task):
+    """
+    Worker entry point: compute the index rasters and summaries of some dates of a section.
+    Rasters are written as float16 to processed/<section>/indices/<date>.npz,
+    only the small summary rows are returned.
+    """
+    output_dir = os.path.join(task["output_dir"], task["section_id"], "indices")
+    os.makedirs(output_dir, exist_ok=True)
+
+    rows = []
+    for date, path in task["images"]:
+        bands = load_bands(path)
+        registration = task["registrations"].get(date)
+        if registration:
+            # Band images come from the same request as the RGB image, so its registration applies
+            bands = np.moveaxis(apply_registration(np.moveaxis(bands, 0, -1), registration), -1, 0)
+
+        indices = compute_indices(bands)
+        raster_path = os.path.join(output_dir, f"{date}.npz")
+        np.savez_compressed(raster_path, **{name: indices[i].astype(np.float16) for i, name in enumerate(INDICES)})
+        rows.append({
+            "date": date,
+            "fingerprint": task["fingerprints"][date],
+            "summary": summarize_indices(indices)
+        })
+
+    return {"section_id": task["section_id"], "rows": rows}
+
+class SpectralTimeSeries:
+    def __init__(self, path):
+        """
+        Columnar time series of index summaries for all sections, one row per
+        (section, date), stored as a single .npz file. Every column is a NumPy
+        array, so queries across sections never open an image.
+        """
+        self.path = path
+        self.columns = self._empty()
+
+        if os.path.isfile(path):
+            try:
+                with np.load(path) as data:
+                    if int(data["version"]) == settings.SPECTRAL_VERSION:
+                        self.columns = {name: data[name] for name in self.columns}
+            except (ValueError, KeyError, OSError) as e:
+                print(f"Ignoring unreadable spectral time series {path}: {str(e)}")
+
+    @staticmethod
+    def _empty():
+        columns = {
+            "section_id": np.array([], dtype="U64"),
+            "date": np.array([], dtype="U10"),
+            "fingerprint": np.array([], dtype="U64")
+        }
+        for index in INDICES:
+            for stat in INDEX_STATS:
+                columns[f"{index}_{stat}"] = np.array([], dtype=np.float32)
+        return columns
+
+    def __len__(self):
+        return len(self.columns["date"])
+
+    def fingerprints(self, section_id):
+        """Stored input fingerprint of every date of a section"""
+        mask = self.columns["section_id"] == section_id
+        return dict(zip(self.columns["date"][mask], self.columns["fingerprint"][mask]))
+
+    def upsert(self, section_id, rows):
+        """Add or replace the rows of a section, keeping the table sorted by section and date"""
+        if not rows:
+            return
+        dates = np.array([row["date"] for row in rows])
+        keep = ~((self.columns["section_id"] == section_id) & np.isin(self.columns["date"], dates))
+        summaries = np.stack([row["summary"] for row in rows])
+
+        new = {
+            "section_id": np.full(len(rows), section_id),
+            "date": dates,
+            "fingerprint": np.array([row["fingerprint"] for row in rows])
+        }
+        for i, index in enumerate(INDICES):
+            for j, stat in enumerate(INDEX_STATS):
+                new[f"{index}_{stat}"] = summaries[:, i, j]
+
+        for name, column in self.columns.items():
+            self.columns[name] = np.concatenate([column[keep], new[name].astype(column.dtype)])
+        order = np.lexsort((self.columns["date"], self.columns["section_id"]))
+        self.columns = {name: column[order] for name, column in self.columns.items()}
+
+    def save(self):
+        """Write the table atomically"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, version=settings.SPECTRAL_VERSION, **self.columns)
+        os.replace(tmp_path, self.path)
+
+    def query(self, index="ndvi", stat="mean", section_ids=None, start=None, end=None):
+        """
+        Return (section_ids, dates, values) arrays for one index statistic,
+        optionally limited to some sections and an inclusive date range.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if section_ids is not None:
+            mask &= np.isin(self.columns["section_id"], list(section_ids))
+        if start:
+            mask &= self.columns["date"] >= start
+        if end:
+            mask &= self.columns["date"] <= end
+        return self.columns["section_id"][mask], self.columns["date"][mask], self.columns[f"{index}_{stat}"][mask]
+
+    def series(self, section_id, index="ndvi", stat="mean"):
+        """(dates, values) of one section"""
+        _, dates, values = self.query(index, stat, section_ids=[section_id])
+        return dates, values
+
+def update_spectral_series(images_dir, output_dir, metadata_dir=None, max_workers=None, section_ids=None, incremental=True):
+    """
+    Compute indices for band images that are new or changed since the last run
+    (or all of them with incremental=False) and append them to processed/spectral_timeseries.npz.
+    Only sections with stored band images (fetched with SPECTRAL_BANDS) take part.
+    """
+    series = SpectralTimeSeries(os.path.join(output_dir, SERIES_FILE_NAME))
+    tasks = []
+
+    for section_id in section_ids or list_sections(images_dir):
+        images = list_section_images(bands_dir(images_dir, section_id))
+        if not images:
+            continue
+        registrations = load_registrations(metadata_dir, section_id) if metadata_dir else {}
+        fingerprints = {
+            date: file_fingerprint(path) + (f":{registrations[date]['dy']},{registrations[date]['dx']}" if date in registrations else "")
+            for date, path in images
+        }
+        stored = series.fingerprints(section_id) if incremental else {}
+        pending = [
+            (date, path) for date, path in images
+            if stored.get(date) != fingerprints[date] or not os.path.isfile(os.path.join(output_dir, section_id, "indices", f"{date}.npz"))
+        ]
+
+        for offset in range(0, len(pending), settings.PROCESS_CHUNK_SIZE):
+            chunk = pending[offset:offset + settings.PROCESS_CHUNK_SIZE]
+            tasks.append({
+                "section_id": section_id,
+                "images": chunk,
+                "fingerprints": {date: fingerprints[date] for date, _ in chunk},
+                "registrations": {date: registrations[date] for date, _ in chunk if date in registrations},
+                "output_dir": output_dir
+            })
+
+    if not tasks:
+        return series, []
+
+    print(f"Computing spectral indices for {sum(len(t['images']) for t in tasks)} images")
+    results, failed = ProcessingScheduler(worker=spectral_task, max_workers=max_workers).run(tasks)
+    for result in results:
+        series.upsert(result["section_id"], result["rows"])
+    series.save()
+    print(f"Spectral time series has {len(series)} rows ({len(failed)} failed tasks)")
+    return series, failed
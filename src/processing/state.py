@@ -0,0 +1,57 @@
+import os
+import json
+
+STATE_FILE_NAME = "state.json"
+
+def file_fingerprint(path):
+    """Cheap fingerprint of an input file based on its size and modification time"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+class ProcessingState:
+    def __init__(self, processed_dir, section_id):
+        """
+        Per-section record of which dates have been processed, with which
+        processing version and from which input files.
+        Stored as data/processed/<section_id>/state.json.
+        """
+        self.section_id = section_id
+        self.path = os.path.join(processed_dir, section_id, STATE_FILE_NAME)
+        self.dates = {}
+
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.dates = json.load(f).get("dates", {})
+            except (ValueError, OSError) as e:
+                print(f"Ignoring unreadable processing state {self.path}: {str(e)}")
+
+    def is_current(self, date, version, fingerprint, previous_fingerprint):
+        """Check whether the stored output for a date is still valid"""
+        entry = self.dates.get(date)
+        if not entry:
+            return False
+
+        if entry.get("version") != version or entry.get("input") != fingerprint or entry.get("previous") != previous_fingerprint:
+            return False
+
+        # Outputs removed from disk must be recomputed as well
+        mask_path = entry.get("result", {}).get("change_mask")
+        return mask_path is None or os.path.isfile(mask_path)
+
+    def record(self, date, version, fingerprint, previous_fingerprint, result):
+        """Mark a date as processed"""
+        self.dates[date] = {
+            "version": version,
+            "input": fingerprint,
+            "previous": previous_fingerprint,
+            "result": result
+        }
+
+    def save(self):
+        """Write the state atomically so an interrupted run never leaves a corrupt file"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"section_id": self.section_id, "dates": self.dates}, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,220 @@
+import os
+import io
+import sys
+import shutil
+import struct
+import subprocess
+import zlib
+from pathlib import Path
+
+from PIL import Image, ImageDraw, GifImagePlugin
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.config import settings
+from src.utils.image_io import list_section_images, list_sections
+from src.processing.scheduler import ProcessingScheduler
+
+TIMELINE_EXTENSIONS = {"gif": "gif", "apng": "png", "mp4": "mp4"}
+
+def iter_frames(images, width=None, labels=True):
+    """
+    Yield timeline frames one at a time, decoded from disk, downscaled and
+    optionally labelled with their date. Only one frame is held in memory.
+    """
+    for date, path in images:
+        with Image.open(path) as img:
+            frame = img.convert("RGB")
+
+        if width and frame.width > width:
+            height = max(1, round(frame.height * width / frame.width))
+            # reducing_gap lets Pillow shrink by an integer factor first, which is much cheaper
+            frame = frame.resize((width, height), Image.BILINEAR, reducing_gap=2.0)
+
+        if labels:
+            draw = ImageDraw.Draw(frame)
+            draw.rectangle([0, 0, 84, 16], fill=(0, 0, 0))
+            draw.text((4, 3), date, fill=(255, 255, 255))
+
+        yield frame
+
+class GifStreamWriter:
+    def __init__(self, path, duration):
+        """Encode a GIF frame by frame, each frame carrying its own local palette"""
+        self.fp = open(path, 'wb')
+        self.duration = duration
+        self.started = False
+
+    def write(self, frame):
+        frame = frame.quantize(colors=256, method=Image.FASTOCTREE)
+        if not self.started:
+            header, _ = GifImagePlugin.getheader(frame, info={"loop": 0})
+            self.fp.writelines(header)
+            self.started = True
+        self.fp.writelines(GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True))
+
+    def close(self):
+        self.fp.write(b";")
+        self.fp.close()
+
+class ApngStreamWriter:
+    def __init__(self, path, duration, num_frames):
+        """
+        Encode an animated PNG frame by frame. Each frame is compressed on its
+        own by Pillow and its IDAT chunks are re-wrapped as APNG frame chunks.
+        """
+        self.fp = open(path, 'wb')
+        self.duration = duration
+        self.num_frames = num_frames
+        self.sequence = 0
+        self.frames_written = 0
+
+    def _chunk(self, chunk_type, data):
+        self.fp.write(struct.pack(">I", len(data)) + chunk_type + data)
+        self.fp.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def write(self, frame):
+        buffer = io.BytesIO()
+        frame.save(buffer, format="PNG", compress_level=settings.TIMELINE_PNG_COMPRESS_LEVEL)
+        chunks = _read_png_chunks(buffer.getvalue())
+
+        if self.frames_written == 0:
+            self.fp.write(b"\x89PNG\r\n\x1a\n")
+            self._chunk(b"IHDR", chunks[0][1])
+            self._chunk(b"acTL", struct.pack(">II", self.num_frames, 0))
+
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence, frame.width, frame.height, 0, 0, self.duration, 1000, 0, 0))
+        self.sequence += 1
+
+        for chunk_type, data in chunks:
+            if chunk_type != b"IDAT":
+                continue
+            if self.frames_written == 0:
+                self._chunk(b"IDAT", data)
+            else:
+                self._chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+                self.sequence += 1
+
+        self.frames_written += 1
+
+    def close(self):
+        self._chunk(b"IEND", b"")
+        self.fp.close()
+
+class Mp4StreamWriter:
+    def __init__(self, path, duration, size):
+        """Pipe raw RGB frames into ffmpeg, which encodes them incrementally"""
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise RuntimeError("ffmpeg is required for MP4 timelines but was not found on PATH")
+
+        # libx264 with yuv420p needs even dimensions
+        self.size = (size[0] - size[0] % 2, size[1] - size[1] % 2)
+        self.process = subprocess.Popen([
+            ffmpeg, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24",
+            "-s", f"{self.size[0]}x{self.size[1]}",
+            "-r", f"{1000 / duration:.4f}",
+            "-i", "-",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p",
+            "-f", "mp4", path
+        ], stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        if frame.size != self.size:
+            frame = frame.crop((0, 0) + self.size)
+        self.process.stdin.write(frame.tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {self.process.returncode}")
+
+def _read_png_chunks(data):
+    """Split an encoded PNG into (type, payload) chunks"""
+    chunks = []
+    pos = 8
+    while pos < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        chunks.append((chunk_type, data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+    return chunks
+
+def render_timeline(images, output_path, fmt=None, width=None, duration=None, labels=None):
+    """
+    Render a timeline animation for a list of (date, path) images.
+    Frames are streamed from disk and encoded as they are produced, so memory
+    use does not grow with the number of dates.
+    """
+    fmt = fmt or settings.TIMELINE_FORMAT
+    width = width or settings.TIMELINE_WIDTH
+    duration = duration or settings.TIMELINE_FRAME_DURATION
+    labels = settings.TIMELINE_LABELS if labels is None else labels
+
+    if fmt not in TIMELINE_EXTENSIONS:
+        raise ValueError(f"Unsupported timeline format: {fmt}")
+    if not images:
+        return 0
+
+    # Encode into a temporary file so a failed run never leaves a truncated animation
+    tmp_path = f"{output_path}.tmp"
+    writer = None
+    size = None
+    frames = 0
+    try:
+        try:
+            for (date, _), frame in zip(images, iter_frames(images, width=width, labels=labels)):
+                if size is None:
+                    size = frame.size
+                elif frame.size != size:
+                    # Every frame of an animation must share the first frame's size
+                    print(f"Resizing {date} frame from {frame.size[0]}x{frame.size[1]} to {size[0]}x{size[1]}")
+                    frame = frame.resize(size, Image.BILINEAR)
+                if writer is None:
+                    if fmt == "gif":
+                        writer = GifStreamWriter(tmp_path, duration)
+                    elif fmt == "apng":
+                        writer = ApngStreamWriter(tmp_path, duration, len(images))
+                    else:
+                        writer = Mp4StreamWriter(tmp_path, duration, frame.size)
+                writer.write(frame)
+                frames += 1
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        # Frame and encoder errors (e.g. ffmpeg exiting non-zero) must not leave the temporary file behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return frames
+
+def render_timeline_task(task):
+    """Worker entry point for rendering one section's timeline"""
+    os.makedirs(os.path.dirname(task["output_path"]), exist_ok=True)
+    frames = render_timeline(task["images"], task["output_path"], fmt=task["format"], width=task.get("width"))
+    return {"section_id": task["section_id"], "output_path": task["output_path"], "frames": frames}
+
+def render_timelines(images_dir, output_dir, fmt=None, width=None, max_workers=None, section_ids=None):
+    """Render timelines for many sections in parallel, one task per section"""
+    fmt = fmt or settings.TIMELINE_FORMAT
+    tasks = []
+    for section_id in section_ids or list_sections(images_dir):
+        images = list_section_images(os.path.join(images_dir, section_id))
+        if images:
+            tasks.append({
+                "section_id": section_id,
+                "images": images,
+                "output_path": os.path.join(output_dir, section_id, f"timeline.{TIMELINE_EXTENSIONS[fmt]}"),
+                "format": fmt,
+                "width": width
+            })
+
+    print(f"Rendering {len(tasks)} {fmt} timelines")
+    results, failed = ProcessingScheduler(worker=render_timeline_task, max_workers=max_workers).run(tasks)
+    for result in results:
+        print(f"Timeline for {result['section_id']} saved to {result['output_path']} ({result['frames']} frames)")
+    return results, failed
@@ -0,0 +1,330 @@
+import os
+import io
+import re
+import sys
+import json
+import asyncio
+import argparse
+import mimetypes
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from PIL import Image
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import settings
+from src.utils.image_io import image_extensions, list_section_images, list_sections
+
+STATUS_TEXT = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error"
+}
+
+SECTION_RE = re.compile(r"^/sections/(\w+)/(\d{4}-\d{2}-\d{2})(?:\.\w+)?$")
+TILE_RE = re.compile(r"^/tiles/(\d+)/(\d+)/(\d+)/(\d{4}-\d{2}-\d{2})(?:\.\w+)?$")
+MOSAIC_RE = re.compile(r"^/mosaics/(\d{4}-\d{2}-\d{2})(?:\.\w+)?$")
+
+class ByteLRUCache:
+    def __init__(self, max_bytes):
+        """LRU cache of encoded responses bounded by total body size"""
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        body = entry["body"]
+        if len(body) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key)["body"])
+        self.entries[key] = entry
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted["body"])
+
+class ImageryServer:
+    def __init__(self, data_dir, cache_bytes=None):
+        """
+        Serve section images, mosaics and pyramid tiles from the data directory.
+        Encoded bodies (original or downscaled) are kept in a byte-bounded LRU,
+        so popular tiles are answered without touching the disk again.
+        """
+        self.data_dir = data_dir
+        self.images_dir = os.path.join(data_dir, 'images')
+        self.cache = ByteLRUCache(cache_bytes or settings.SERVER_CACHE_BYTES)
+        # Loads in progress, so concurrent requests for one tile share a single read
+        self.loading = {}
+
+    def resolve(self, path):
+        """Map a request path to a file on disk, or None"""
+        match = SECTION_RE.match(path)
+        if match:
+            section_id, date = match.groups()
+            return self._find_image(os.path.join(self.images_dir, section_id), date)
+
+        match = TILE_RE.match(path)
+        if match:
+            z, x, y, date = match.groups()
+            return self._find_image(os.path.join(self.data_dir, 'tiles', date, z, x), y)
+
+        match = MOSAIC_RE.match(path)
+        if match:
+            return self._find_image(os.path.join(self.data_dir, 'mosaics'), match.group(1))
+
+        return None
+
+    def _find_image(self, directory, stem):
+        for ext in image_extensions():
+            candidate = os.path.join(directory, f"{stem}{ext}")
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def index(self):
+        """JSON listing of the sections and dates available"""
+        sections = {
+            section_id: [date for date, _ in list_section_images(os.path.join(self.images_dir, section_id))]
+            for section_id in list_sections(self.images_dir)
+        }
+        return json.dumps({"sections": sections}).encode()
+
+    async def load(self, file_path, width):
+        """Return the cached entry for a file at the requested width, loading it if needed"""
+        stat = await asyncio.get_running_loop().run_in_executor(None, os.stat, file_path)
+        key = (file_path, stat.st_size, stat.st_mtime_ns, width)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        if key in self.loading:
+            return await self.loading[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(None, _read_body, file_path, width)
+            entry = {
+                "body": body,
+                "etag": f'"{stat.st_size:x}-{stat.st_mtime_ns:x}-{width or 0}"',
+                "content_type": mimetypes.guess_type(file_path)[0] or "application/octet-stream",
+                "last_modified": formatdate(stat.st_mtime, usegmt=True)
+            }
+            self.cache.put(key, entry)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self.loading[key]
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection, honouring HTTP/1.1 keep-alive"""
+        try:
+            while True:
+                # readline() raises ValueError for lines longer than the stream limit (64 KiB)
+                try:
+                    request_line = await reader.readline()
+                except ValueError:
+                    await self.respond(writer, 400, b"Request line too long\n")
+                    break
+                if not request_line:
+                    break
+
+                headers = {}
+                try:
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                except ValueError:
+                    await self.respond(writer, 431, b"Header line too long\n")
+                    break
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, b"Bad request\n")
+                    break
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await self.dispatch(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, writer, method, target, headers, keep_alive):
+        if method not in ("GET", "HEAD"):
+            await self.respond(writer, 405, b"Method not allowed\n", keep_alive=keep_alive)
+            return
+
+        url = urlsplit(target)
+        head_only = method == "HEAD"
+
+        if url.path in ("/", "/sections"):
+            await self.respond(writer, 200, self.index(), {"Content-Type": "application/json"}, keep_alive, head_only)
+            return
+
+        # resolve() and load() touch the file system, which must not block the event loop
+        file_path = await asyncio.get_running_loop().run_in_executor(None, self.resolve, url.path)
+        if file_path is None:
+            await self.respond(writer, 404, b"Not found\n", keep_alive=keep_alive, head_only=head_only)
+            return
+
+        query = parse_qs(url.query)
+        try:
+            width = int(query["w"][0]) if "w" in query else None
+            if width is not None and width <= 0:
+                raise ValueError(f"non-positive width {width}")
+        except ValueError:
+            await self.respond(writer, 400, b"Invalid width\n", keep_alive=keep_alive, head_only=head_only)
+            return
+
+        try:
+            entry = await self.load(file_path, width)
+        except Exception as e:
+            print(f"Error serving {file_path}: {str(e)}")
+            await self.respond(writer, 500, b"Internal error\n", keep_alive=keep_alive, head_only=head_only)
+            return
+
+        response_headers = {
+            "Content-Type": entry["content_type"],
+            "ETag": entry["etag"],
+            "Last-Modified": entry["last_modified"],
+            "Accept-Ranges": "bytes",
+            "Cache-Control": f"max-age={settings.SERVER_MAX_AGE}"
+        }
+
+        if _etag_matches(headers.get("if-none-match"), entry["etag"]):
+            await self.respond(writer, 304, b"", response_headers, keep_alive, head_only=True)
+            return
+
+        body = entry["body"]
+        range_header = headers.get("range")
+        if range_header and headers.get("if-range", entry["etag"]) == entry["etag"]:
+            byte_range = _parse_range(range_header, len(body))
+            if byte_range is None:
+                response_headers["Content-Range"] = f"bytes */{len(body)}"
+                await self.respond(writer, 416, b"", response_headers, keep_alive)
+                return
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            await self.respond(writer, 206, body[start:end + 1], response_headers, keep_alive, head_only)
+            return
+
+        await self.respond(writer, 200, body, response_headers, keep_alive, head_only)
+
+    async def respond(self, writer, status, body, headers=None, keep_alive=False, head_only=False):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if not head_only:
+            writer.write(body)
+        await writer.drain()
+
+def _read_body(file_path, width):
+    """Read a file, downscaling it first if a smaller width was requested"""
+    if not width:
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+    with Image.open(file_path) as img:
+        if img.width <= width:
+            img.load()
+            scaled = img
+        else:
+            height = max(1, round(img.height * width / img.width))
+            scaled = img.resize((width, height), Image.BILINEAR, reducing_gap=2.0)
+        buffer = io.BytesIO()
+        scaled.save(buffer, format=img.format or "PNG")
+        return buffer.getvalue()
+
+def _etag_matches(header, etag):
+    """Weak comparison of an If-None-Match list ("*" or comma-separated tags) against an entity tag"""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    if "*" in tags:
+        return True
+    opaque = lambda tag: tag[2:] if tag.startswith("W/") else tag
+    return opaque(etag) in {opaque(tag) for tag in tags}
+
+def _parse_range(header, length):
+    """Parse a single "bytes=start-end" range, returning inclusive offsets or None if unsatisfiable"""
+    match = re.match(r"^bytes=(\d*)-(\d*)$", header.strip())
+    if not match or length == 0:
+        return None
+    start, end = match.groups()
+    if start == "":
+        if end == "":
+            return None
+        # Suffix range: the last N bytes
+        start = max(0, length - int(end))
+        end = length - 1
+    else:
+        start = int(start)
+        end = min(int(end), length - 1) if end else length - 1
+    if start > end or start >= length:
+        return None
+    return start, end
+
+async def serve(host, port, data_dir):
+    server = ImageryServer(data_dir)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving {data_dir} on http://{host}:{port}/")
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP server for stored satellite imagery')
+    parser.add_argument('--host', type=str, default=settings.SERVER_HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=settings.SERVER_PORT, help='Port to listen on')
+    parser.add_argument('--data-dir', type=str, help='Data directory to serve (default: settings.DATA_DIR)')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or os.path.join(str(Path(__file__).parent.parent), settings.DATA_DIR)
+    try:
+        asyncio.run(serve(args.host, args.port, os.path.abspath(data_dir)))
+    except KeyboardInterrupt:
+        print("Server stopped")
+
+if __name__ == "__main__":
+    start_time = datetime.now()
+    main()
+    end_time = datetime.now()
+    print(f"Server ran for {(end_time - start_time).total_seconds()} seconds")
@@ -4,6 +4,7 @@ from datetime import datetime as dt, timedelta
 import re
 import numpy as np
 import os
+import shapely
 from shapely.geometry import Polygon, Point, box, LineString
 import math
 
@@ -15,6 +16,149 @@ def calculate_distance(coord1, coord2):
     """Calculate the distance between two geographical coordinates"""
     return geodesic(coord1, coord2).kilometers
 
+# WGS84 ellipsoid parameters used by the vectorized distance functions
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+
+def calculate_distances(lats1, lons1, lats2, lons2):
+    """
+    Vectorized ellipsoidal distance in kilometers between arrays of coordinates.
+    Uses Lambert's formula on the WGS84 ellipsoid, which agrees with geopy's
+    geodesic to within a few meters at the scale of a region while running
+    over millions of pairs at once. Inputs broadcast like NumPy arrays.
+    """
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lons1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons2, dtype=np.float64))
+
+    # Reduced latitudes
+    beta1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    beta2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+
+    # Central angle on the auxiliary sphere (haversine form, stable for short distances)
+    h = np.sin((beta2 - beta1) / 2) ** 2 + np.cos(beta1) * np.cos(beta2) * np.sin((lon2 - lon1) / 2) ** 2
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    p = (beta1 + beta2) / 2
+    q = (beta2 - beta1) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / np.cos(sigma / 2) ** 2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / np.sin(sigma / 2) ** 2
+        distance = WGS84_A_KM * (sigma - WGS84_F / 2 * (x + y))
+
+    return np.where(sigma == 0, 0.0, distance)
+
+class SectionIndex:
+    def __init__(self, sections, cell_size=None):
+        """
+        Grid index over the sections from divide_region_into_sections.
+        The union of the section bounds is split into uniform cells and each
+        cell stores the few sections overlapping it, so a lookup is one cell
+        computation plus a handful of vectorized bounds checks per point.
+        """
+        self.section_ids = np.array([section["id"] for section in sections])
+        self._id_table = np.array([section["id"] for section in sections] + [None], dtype=object)
+        self.bounds = np.array([
+            [s["bounds"]["min_lat"], s["bounds"]["max_lat"], s["bounds"]["min_lon"], s["bounds"]["max_lon"]]
+            for s in sections
+        ], dtype=np.float64)
+
+        self.min_lat = self.bounds[:, 0].min()
+        self.max_lat = self.bounds[:, 1].max()
+        self.min_lon = self.bounds[:, 2].min()
+        self.max_lon = self.bounds[:, 3].max()
+        lat_span = self.max_lat - self.min_lat
+        lon_span = self.max_lon - self.min_lon
+
+        # Default cell size: the smallest section dimension, so most cells touch one or two sections
+        if cell_size is None:
+            cell_size = min((self.bounds[:, 1] - self.bounds[:, 0]).min(), (self.bounds[:, 3] - self.bounds[:, 2]).min())
+        self.cell_size = cell_size
+        self.rows = max(1, int(math.ceil(lat_span / cell_size)))
+        self.cols = max(1, int(math.ceil(lon_span / cell_size)))
+
+        buckets = [[] for _ in range(self.rows * self.cols)]
+        for index, (min_lat, max_lat, min_lon, max_lon) in enumerate(self.bounds):
+            row_from, col_from = self._cell(min_lat, min_lon)
+            row_to, col_to = self._cell(max_lat, max_lon)
+            for row in range(row_from, row_to + 1):
+                for col in range(col_from, col_to + 1):
+                    buckets[row * self.cols + col].append(index)
+
+        # Pad buckets into a dense (cells, max_candidates) table; -1 marks empty slots
+        depth = max(1, max(len(bucket) for bucket in buckets))
+        self.candidates = np.full((len(buckets), depth), -1, dtype=np.int32)
+        for cell, bucket in enumerate(buckets):
+            self.candidates[cell, :len(bucket)] = bucket
+
+    def _cell(self, lat, lon):
+        row = min(max(int((lat - self.min_lat) / self.cell_size), 0), self.rows - 1)
+        col = min(max(int((lon - self.min_lon) / self.cell_size), 0), self.cols - 1)
+        return row, col
+
+    def lookup(self, lats, lons):
+        """Return the index of the section containing each point, or -1 if none does"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        in_grid = (
+            (lats >= self.min_lat) & (lats <= self.max_lat)
+            & (lons >= self.min_lon) & (lons <= self.max_lon)
+        )
+        # Clipping keeps points on the outer max edge in the last row/column
+        rows = np.clip(((lats - self.min_lat) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        cols = np.clip(((lons - self.min_lon) / self.cell_size).astype(np.int64), 0, self.cols - 1)
+        cells = np.where(in_grid, rows * self.cols + cols, 0)
+
+        result = np.full(lats.shape, -1, dtype=np.int32)
+        for slot in range(self.candidates.shape[1]):
+            candidate = self.candidates[cells, slot]
+            bounds = self.bounds[np.maximum(candidate, 0)]
+            inside = (
+                in_grid & (candidate >= 0) & (result < 0)
+                & (lats >= bounds[..., 0]) & (lats <= bounds[..., 1])
+                & (lons >= bounds[..., 2]) & (lons <= bounds[..., 3])
+            )
+            result[inside] = candidate[inside]
+        return result
+
+    def lookup_ids(self, lats, lons):
+        """Return the section id containing each point, or None if none does"""
+        # The trailing None is what index -1 resolves to
+        return self._id_table[self.lookup(lats, lons)]
+
+def points_in_polygon(polygon, lats, lons):
+    """
+    Vectorized point-in-polygon test against a prepared Shapely polygon.
+    Points outside the polygon's bounding box are rejected before the exact test.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    min_lon, min_lat, max_lon, max_lat = polygon.bounds
+
+    candidates = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+    inside = np.zeros(lats.shape, dtype=bool)
+    shapely.prepare(polygon)
+    inside[candidates] = shapely.contains_xy(polygon, lons[candidates], lats[candidates])
+    return inside
+
+def assign_points_to_sections(lats, lons, sections=None, polygon=None, index=None):
+    """
+    Map many coordinates to section ids and, if a border polygon is given,
+    to AOI membership. Returns (section_ids, inside_aoi) arrays; points outside
+    the polygon get no section.
+    """
+    if index is None:
+        index = SectionIndex(sections)
+    section_ids = index.lookup_ids(lats, lons)
+
+    inside = None
+    if polygon is not None:
+        inside = points_in_polygon(polygon, lats, lons)
+        section_ids[~inside] = None
+    return section_ids, inside
+
 def find_gaza_coordinates_file():
     """Find the Gaza Coordinates.txt file in various locations"""
     possible_locations = [
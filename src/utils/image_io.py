@@ -0,0 +1,54 @@
+import os
+import numpy as np
+from PIL import Image
+
+from src.config import settings
+
+# Extensions recognised as stored imagery inside a section directory
+IMAGE_EXTENSIONS = (".png", ".webp")
+
+def image_extensions():
+    """IMAGE_EXTENSIONS with the extension of the configured storage codec first"""
+    codec = settings.IMAGE_STORAGE_CODEC
+    current = "." + (settings.IMAGE_FORMAT if codec == "original" else codec)
+    return sorted(IMAGE_EXTENSIONS, key=lambda ext: ext != current)
+
+def list_section_images(section_dir):
+    """
+    Return the images stored for a section as a date-sorted list of (date, path).
+    File names are expected to follow the "<YYYY-MM-DD>.<ext>" convention used by fetch_imagery.
+    A date stored under several extensions (after a codec change) is listed once,
+    preferring the extension of the current codec.
+    """
+    if not os.path.isdir(section_dir):
+        return []
+
+    extensions = image_extensions()
+    images = {}
+    for name in os.listdir(section_dir):
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext in extensions and len(stem) == 10:
+            rank = extensions.index(ext)
+            if stem not in images or rank < images[stem][0]:
+                images[stem] = (rank, os.path.join(section_dir, name))
+
+    return [(date, path) for date, (_, path) in sorted(images.items())]
+
+def list_sections(images_dir):
+    """Return the section ids that have an image directory, in natural order"""
+    if not os.path.isdir(images_dir):
+        return []
+
+    section_ids = [name for name in os.listdir(images_dir) if os.path.isdir(os.path.join(images_dir, name))]
+    return sorted(section_ids, key=_natural_key)
+
+def load_image_array(path, mode="L"):
+    """Decode an image from disk into a float32 NumPy array"""
+    with Image.open(path) as img:
+        return np.asarray(img.convert(mode), dtype=np.float32)
+
+def _natural_key(section_id):
+    """Sort key so that section_2 comes before section_10"""
+    prefix, _, index = section_id.rpartition("_")
+    return (prefix, int(index)) if index.isdigit() else (section_id, -1)
@@ -0,0 +1,75 @@
+import io
+import math
+import numpy as np
+from PIL import Image, ImageStat
+
+# Percentiles of the luminance histogram stored with every image
+HISTOGRAM_PERCENTILES = (2, 25, 50, 75, 98)
+
+# Thresholds for classifying pixels on the 0-255 scale
+CLOUD_MIN_LUMA = 200
+CLOUD_MAX_SATURATION = 30
+NODATA_MAX_VALUE = 3
+
+def compute_image_stats(image_data, reduce_factor=4):
+    """
+    Compute a compact statistics vector for an encoded image.
+    Band means, deviations and histogram percentiles are exact; cloud and
+    no-data fractions are estimated on a reduced copy to keep ingest cheap.
+    """
+    with Image.open(io.BytesIO(image_data)) as img:
+        rgb = img.convert("RGB")
+
+    stat = ImageStat.Stat(rgb)
+    luma_histogram = rgb.convert("L").histogram()
+
+    small = np.asarray(rgb.reduce(reduce_factor) if reduce_factor > 1 else rgb, dtype=np.int16)
+    brightest = small.max(axis=2)
+    darkest = small.min(axis=2)
+    luma = small @ np.array([299, 587, 114]) // 1000
+
+    return {
+        "width": rgb.width,
+        "height": rgb.height,
+        "band_mean": [round(v, 2) for v in stat.mean],
+        "band_std": [round(v, 2) for v in stat.stddev],
+        "luma_percentiles": dict(zip((f"p{p}" for p in HISTOGRAM_PERCENTILES), histogram_percentiles(luma_histogram, HISTOGRAM_PERCENTILES))),
+        "cloud_fraction": round(float(((luma >= CLOUD_MIN_LUMA) & (brightest - darkest <= CLOUD_MAX_SATURATION)).mean()), 4),
+        "nodata_fraction": round(float((brightest <= NODATA_MAX_VALUE).mean()), 4),
+        "phash": perceptual_hash(rgb)
+    }
+
+def histogram_percentiles(histogram, percentiles):
+    """Read percentiles off a 256-bin histogram without touching the pixels again"""
+    cumulative = np.cumsum(histogram)
+    total = cumulative[-1]
+    return [int(np.searchsorted(cumulative, total * p / 100.0)) for p in percentiles]
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis matrix"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(math.pi * (2 * x + 1) * k / (2 * n)) * math.sqrt(2.0 / n)
+    matrix[0] /= math.sqrt(2.0)
+    return matrix
+
+_DCT_32 = _dct_matrix(32)
+
+def perceptual_hash(img):
+    """64-bit DCT perceptual hash as a hex string"""
+    small = np.asarray(img.convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    coefficients = (_DCT_32 @ small @ _DCT_32.T)[:8, :8].flatten()
+    # Skip the DC term when computing the threshold, it only encodes overall brightness
+    bits = coefficients > np.median(coefficients[1:])
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+def hamming_distances(hashes, others):
+    """Bit distances between hex hashes, element-wise or against a single hex hash"""
+    values = np.array([int(h, 16) for h in hashes], dtype=np.uint64)
+    if isinstance(others, str):
+        other_values = np.uint64(int(others, 16))
+    else:
+        other_values = np.array([int(h, 16) for h in others], dtype=np.uint64)
+    xor = np.atleast_1d(values ^ other_values)
+    # Popcount over the eight bytes of each value
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from shapely.geometry import box
+
+from src.models.aoi import AOI, load_aois, sections_for_aois
+
+class TestAOI(unittest.TestCase):
+
+    def setUp(self):
+        self.aoi_dir = tempfile.mkdtemp()
+        north = {"type": "FeatureCollection", "features": [{
+            "type": "Feature",
+            "properties": {"name": "North Gaza"},
+            "geometry": {"type": "Polygon", "coordinates": [[[34.45, 31.5], [34.57, 31.5], [34.57, 31.6], [34.45, 31.6], [34.45, 31.5]]]}
+        }]}
+        city = {"type": "Polygon", "coordinates": [[[34.5, 31.45], [34.62, 31.45], [34.62, 31.55], [34.5, 31.55], [34.5, 31.45]]]}
+        for name, data in (("north.geojson", north), ("gaza_city.geojson", city)):
+            with open(os.path.join(self.aoi_dir, name), 'w') as f:
+                json.dump(data, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.aoi_dir)
+
+    def test_overlapping_aois_share_cells(self):
+        aois = load_aois(self.aoi_dir)
+        self.assertEqual(sorted(aois), ["gaza_city", "north_gaza"])
+
+        north = {s["id"] for s in aois["north_gaza"].sections()}
+        city = {s["id"] for s in aois["gaza_city"].sections()}
+        shared = north & city
+        self.assertTrue(shared)
+
+        union = sections_for_aois(aois)
+        self.assertEqual(len(union), len(north | city))
+        for section in union:
+            bounds = section["bounds"]
+            self.assertLess(bounds["min_lat"], bounds["max_lat"])
+            self.assertLess(bounds["min_lon"], bounds["max_lon"])
+
+    def test_grid_aligned_aoi_has_no_edge_cells(self):
+        # Edges on 0.05 x 0.1 degree grid lines: exactly 2 x 2 cells, none that only touch an edge
+        sections = AOI("aligned", box(34.3, 31.15, 34.5, 31.25)).sections(cell_lat=0.05, cell_lon=0.1)
+        self.assertEqual(len(sections), 4)
+        self.assertEqual({s["bounds"]["min_lat"] for s in sections}, {31.15, 31.2})
+        self.assertEqual({s["bounds"]["min_lon"] for s in sections}, {34.3, 34.4})
+
+        # An L-shaped AOI skips the cell that only touches its inner corner
+        l_shape = box(34.3, 31.15, 34.5, 31.2).union(box(34.3, 31.2, 34.4, 31.25))
+        self.assertEqual(len(AOI("l_shape", l_shape).sections(cell_lat=0.05, cell_lon=0.1)), 3)
+
+    def test_select_by_name(self):
+        aois = load_aois(self.aoi_dir, names=["gaza_city"])
+        self.assertEqual(list(aois), ["gaza_city"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from src.api.collection_stats import CollectionStats, EmptyDates
+
+COLLECTIONS = [{"id": "sentinel-2-l2a"}, {"id": "sentinel-2-l1c"}]
+
+class TestCollectionStats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'collection_stats.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _ids(self, stats, section_id, date):
+        return [c["id"] for c in stats.order(section_id, date, COLLECTIONS)]
+
+    def test_configured_order_without_history(self):
+        stats = CollectionStats(self.path, explore_rate=0)
+        self.assertEqual(self._ids(stats, 'section_0', '2023-01-01'), ['sentinel-2-l2a', 'sentinel-2-l1c'])
+
+    def test_failing_collection_is_tried_last_then_skipped(self):
+        stats = CollectionStats(self.path, explore_rate=0)
+        for _ in range(3):
+            stats.record('section_0', '2023-01-01', 'sentinel-2-l2a', False)
+            stats.record('section_0', '2023-01-01', 'sentinel-2-l1c', True)
+        self.assertEqual(self._ids(stats, 'section_0', '2023-01-08'), ['sentinel-2-l1c', 'sentinel-2-l2a'])
+
+        for _ in range(20):
+            stats.record('section_0', '2023-01-08', 'sentinel-2-l2a', False)
+            stats.record('section_0', '2023-01-08', 'sentinel-2-l1c', True)
+        self.assertEqual(self._ids(stats, 'section_0', '2023-01-15'), ['sentinel-2-l1c'])
+
+        # Other periods of other sections only inherit the overall rate and keep both candidates
+        self.assertEqual(self._ids(stats, 'section_5', '2023-06-01'), ['sentinel-2-l1c', 'sentinel-2-l2a'])
+
+    def test_save_merges_counts_from_several_workers(self):
+        first = CollectionStats(self.path)
+        second = CollectionStats(self.path)
+        first.record('section_0', '2023-01-01', 'sentinel-2-l2a', True)
+        second.record('section_0', '2023-01-01', 'sentinel-2-l2a', False)
+        first.save()
+        second.save()
+
+        counts = CollectionStats(self.path).counts
+        self.assertEqual(counts['section_0|2023-01']['sentinel-2-l2a'], [1, 2])
+
+    def test_scope_totals_follow_records_and_saves(self):
+        stats = CollectionStats(self.path, save_every=3)
+        outcomes = [('section_0', '2023-01-01', True), ('section_0', '2023-02-01', False),
+                    ('section_1', '2023-01-01', False), ('section_1', '2023-01-08', True)]
+        for section_id, date, success in outcomes:
+            stats.record(section_id, date, 'sentinel-2-l2a', success)
+        stats.save()
+
+        for current in (stats, CollectionStats(self.path)):
+            self.assertEqual(current.totals['*']['sentinel-2-l2a'], [2, 4])
+            self.assertEqual(current.totals['section_1|*']['sentinel-2-l2a'], [1, 2])
+            self.assertEqual(current.totals['*|2023-01']['sentinel-2-l2a'], [2, 3])
+            self.assertEqual(current._estimate('section_0', '2023-01-15', 'sentinel-2-l2a'),
+                             stats._estimate('section_0', '2023-01-15', 'sentinel-2-l2a'))
+
+    def test_empty_dates_merge_on_save(self):
+        path = os.path.join(self.tmp.name, 'empty_dates.json')
+        first = EmptyDates(path)
+        second = EmptyDates(path)
+        first.add('section_0', '2023-01-01')
+        second.add('section_0', '2023-01-08')
+        second.add('section_1', '2023-01-01')
+        first.save()
+        second.save()
+
+        dates = EmptyDates(path)
+        self.assertEqual(dates.for_section('section_0'), {'2023-01-01', '2023-01-08'})
+        self.assertEqual(dates.for_section('section_1'), {'2023-01-01'})
+        self.assertEqual(dates.for_section('section_2'), set())
+
+    def test_empty_dates_expire(self):
+        path = os.path.join(self.tmp.name, 'empty_dates.json')
+        dates = EmptyDates(path, retry_days=30)
+        dates.add('section_0', '2023-01-01', recorded_on='2000-01-01')
+        dates.add('section_0', '2023-01-08')
+        self.assertEqual(dates.for_section('section_0'), {'2023-01-08'})
+
+        # Recording a date again renews it
+        dates.add('section_0', '2023-01-01')
+        dates.save()
+        self.assertEqual(EmptyDates(path, retry_days=30).for_section('section_0'), {'2023-01-01', '2023-01-08'})
+
+if __name__ == '__main__':
+    unittest.main()
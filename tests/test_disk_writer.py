@@ -0,0 +1,108 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from src.config import settings
+from src.api.disk_writer import WriteBehindWriter, encode_image, write_atomic
+
+def _png_bytes(seed=0):
+    array = np.random.default_rng(seed).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format="PNG", compress_level=0)
+    return buffer.getvalue(), array
+
+class TestEncodeImage(unittest.TestCase):
+
+    def test_png_and_webp_are_lossless(self):
+        data, array = _png_bytes()
+        for codec in ("png", "webp"):
+            encoded = encode_image(data, codec, level=6)
+            with Image.open(io.BytesIO(encoded)) as img:
+                self.assertEqual(img.format, codec.upper())
+                np.testing.assert_array_equal(np.asarray(img.convert("RGB")), array)
+
+        self.assertIs(encode_image(data, "original"), data)
+        with self.assertRaises(ValueError):
+            encode_image(data, "jpeg")
+
+    def test_each_codec_uses_its_own_level_setting(self):
+        data, _ = _png_bytes()
+        with mock.patch.object(settings, "IMAGE_STORAGE_LEVEL", 9), \
+             mock.patch.object(settings, "IMAGE_STORAGE_WEBP_EFFORT", 100), \
+             mock.patch("src.api.disk_writer.Image.Image.save", autospec=True) as save:
+            encode_image(data, "png")
+            encode_image(data, "webp")
+
+        self.assertEqual(save.call_args_list[0].kwargs["compress_level"], 9)
+        self.assertEqual(save.call_args_list[1].kwargs["quality"], 100)
+
+class TestWriteAtomic(unittest.TestCase):
+
+    def test_failed_write_leaves_no_partial_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'section_0', '2023-01-01.png')
+            write_atomic(path, b"original")
+
+            with self.assertRaises(TypeError):
+                write_atomic(path, "not bytes")
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b"original")
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['2023-01-01.png'])
+
+class TestWriteBehindWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bounded_queue_blocks_submit_until_writers_catch_up(self):
+        data, _ = _png_bytes()
+        release = threading.Event()
+        writer = WriteBehindWriter(num_writers=1, max_queue=1, codec="original")
+        paths = [os.path.join(self.tmp.name, f"{i}.png") for i in range(3)]
+
+        # The single writer holds the first payload, the second fills the queue
+        writer.submit(data, paths[0], on_saved=release.wait)
+        writer.submit(data, paths[1])
+        blocked = threading.Thread(target=writer.submit, args=(data, paths[2]))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+
+        release.set()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        self.assertEqual(writer.flush(), [])
+        self.assertTrue(all(os.path.isfile(path) for path in paths))
+        writer.close()
+        self.assertEqual(writer.written, 3)
+
+    def test_failed_writes_are_reported_by_flush_and_callback(self):
+        data, _ = _png_bytes()
+        writer = WriteBehindWriter(num_writers=2, codec="png")
+        saved, failed = [], []
+        good_path = os.path.join(self.tmp.name, 'good.png')
+        bad_path = os.path.join(self.tmp.name, 'bad.png')
+
+        writer.submit(data, good_path, on_saved=lambda: saved.append(good_path), on_failed=failed.append)
+        writer.submit(b"not an image", bad_path, on_saved=lambda: saved.append(bad_path), on_failed=failed.append)
+
+        failures = writer.flush()
+        self.assertEqual([path for path, _ in failures], [bad_path])
+        self.assertEqual(saved, [good_path])
+        self.assertEqual(len(failed), 1)
+        self.assertFalse(os.path.exists(bad_path))
+        self.assertEqual(writer.flush(), [])
+        writer.close()
+        self.assertEqual((writer.written, writer.failed), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from src.config import settings
+from src.api.collection_stats import EmptyDates
+from src.api.fetch_planner import estimate_processing_units, plan_fetch, plan_from_disk, apply_budget, summarize_plan
+from src.processing.state import ProcessingState
+from src.processing.spectral import bands_dir
+from src.utils.geo_helpers import divide_region_into_sections
+
+COLLECTIONS = [{"id": "sentinel-2-l2a"}, {"id": "sentinel-2-l1c"}]
+DATES = ['2023-01-01', '2023-01-08', '2023-01-15']
+
+class TestFetchPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.images_dir = os.path.join(self.tmp.name, 'images')
+        self.processed_dir = os.path.join(self.tmp.name, 'processed')
+        self.sections = divide_region_into_sections(31.2, 31.6, 34.2, 34.6, 2, 1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_processing_units(self):
+        self.assertAlmostEqual(estimate_processing_units(512, 512, 'input: [{ bands: ["B04", "B03", "B02"] }]'), 1.0)
+        self.assertAlmostEqual(estimate_processing_units(1024, 512, 'bands: ["B04", "B08", "B11", "B12", "dataMask"]'), 8 / 3)
+        self.assertAlmostEqual(estimate_processing_units(16, 16, 'bands: ["B04"]'), 0.01)
+
+    def test_plan_is_newest_first_and_skips_stored_images(self):
+        section_dir = os.path.join(self.images_dir, 'section_0')
+        os.makedirs(section_dir)
+        Image.fromarray(np.zeros((8, 8), dtype=np.uint8)).save(os.path.join(section_dir, '2023-01-15.png'))
+
+        plan = plan_fetch(self.sections, DATES, self.images_dir, self.processed_dir, COLLECTIONS)
+        self.assertEqual(len(plan), 5)
+        self.assertEqual([(item['date'], item['section_id']) for item in plan[:2]], [('2023-01-15', 'section_1'), ('2023-01-08', 'section_0')])
+        self.assertNotIn(('section_0', '2023-01-15'), [(item['section_id'], item['date']) for item in plan])
+
+    def test_empty_dates_are_not_planned_again(self):
+        empty_dates = EmptyDates(os.path.join(self.tmp.name, settings.EMPTY_DATES_FILE))
+        empty_dates.add('section_1', '2023-01-08')
+        empty_dates.save()
+
+        plan = plan_from_disk(self.sections, DATES, self.tmp.name, COLLECTIONS)
+        self.assertEqual(len(plan), 5)
+        self.assertNotIn(('section_1', '2023-01-08'), [(item['section_id'], item['date']) for item in plan])
+
+    def test_dates_without_bands_are_planned_when_bands_are_requested(self):
+        for directory in (os.path.join(self.images_dir, 'section_0'), bands_dir(self.images_dir, 'section_0')):
+            os.makedirs(directory, exist_ok=True)
+        for date in ('2023-01-08', '2023-01-15'):
+            Image.fromarray(np.zeros((8, 8), dtype=np.uint8)).save(os.path.join(self.images_dir, 'section_0', f"{date}.png"))
+        Image.fromarray(np.zeros((8, 8, 4), dtype=np.uint8)).save(os.path.join(bands_dir(self.images_dir, 'section_0'), '2023-01-15.png'))
+
+        with mock.patch.object(settings, "SPECTRAL_BANDS", True):
+            plan = plan_fetch(self.sections[:1], DATES, self.images_dir, self.processed_dir, COLLECTIONS)
+        self.assertEqual(sorted(item['date'] for item in plan), ['2023-01-01', '2023-01-08'])
+
+    def test_recent_change_raises_priority_and_budget_cuts_plan(self):
+        state = ProcessingState(self.processed_dir, 'section_1')
+        state.record('2022-12-25', 1, 'a', None, {"changed_fraction": 0.3})
+        state.save()
+
+        plan = plan_fetch(self.sections, DATES, self.images_dir, self.processed_dir, COLLECTIONS)
+        # Two weeks of age cost less than the boost of the section that changed
+        self.assertEqual([item['section_id'] for item in plan], ['section_1'] * 3 + ['section_0'] * 3)
+        self.assertEqual([item['date'] for item in plan[:3]], ['2023-01-15', '2023-01-08', '2023-01-01'])
+
+        within, deferred = apply_budget(plan, budget=plan[0]['processing_units'] * 2.5)
+        self.assertEqual(len(within), 2)
+        self.assertEqual(len(within) + len(deferred), len(plan))
+        self.assertAlmostEqual(summarize_plan(within)['processing_units'], plan[0]['processing_units'] * 2)
+
+if __name__ == '__main__':
+    unittest.main()
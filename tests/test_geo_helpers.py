@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+from geopy.distance import geodesic
+from shapely.geometry import box
+
+from src.utils.geo_helpers import calculate_distances, SectionIndex, assign_points_to_sections, divide_region_into_sections
+
+class TestGeoHelpers(unittest.TestCase):
+
+    def setUp(self):
+        self.sections = divide_region_into_sections(31.2, 31.6, 34.2, 34.6, 10, 2)
+
+    def test_distances_match_geodesic(self):
+        lats = np.array([31.25, 31.40, 31.59])
+        lons = np.array([34.22, 34.40, 34.55])
+        distances = calculate_distances(lats, lons, 31.5, 34.45)
+        for lat, lon, distance in zip(lats, lons, distances):
+            self.assertAlmostEqual(distance, geodesic((lat, lon), (31.5, 34.45)).kilometers, places=2)
+        self.assertEqual(calculate_distances(31.5, 34.45, 31.5, 34.45), 0.0)
+
+    def test_lookup_matches_section_bounds(self):
+        index = SectionIndex(self.sections)
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(31.1, 31.7, 5000)
+        lons = rng.uniform(34.1, 35.1, 5000)
+        found = index.lookup(lats, lons)
+
+        for lat, lon, section_index in zip(lats, lons, found):
+            containing = [
+                i for i, s in enumerate(self.sections)
+                if s["bounds"]["min_lat"] <= lat <= s["bounds"]["max_lat"] and s["bounds"]["min_lon"] <= lon <= s["bounds"]["max_lon"]
+            ]
+            if containing:
+                self.assertIn(section_index, containing)
+            else:
+                self.assertEqual(section_index, -1)
+
+    def test_points_outside_polygon_get_no_section(self):
+        polygon = box(34.2, 31.2, 34.3, 31.3)
+        section_ids, inside = assign_points_to_sections([31.22, 31.35, 10.0], [34.25, 34.25, 10.0], self.sections, polygon=polygon)
+        self.assertEqual(list(inside), [True, False, False])
+        self.assertEqual(section_ids[0], self.sections[0]["id"])
+        self.assertIsNone(section_ids[1])
+        self.assertIsNone(section_ids[2])
+
+if __name__ == '__main__':
+    unittest.main()
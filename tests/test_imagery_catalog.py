@@ -0,0 +1,65 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from src.utils.image_stats import compute_image_stats, hamming_distances
+from src.models.imagery_catalog import ImageryCatalog
+
+def _encode(array):
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _scene(seed):
+    rng = np.random.default_rng(seed)
+    return (rng.random((64, 128, 3)) * 120).astype(np.uint8)
+
+class TestImageryCatalog(unittest.TestCase):
+
+    def test_stats_detect_cloud_and_nodata(self):
+        image = _scene(0)
+        image[:32] = 250
+        image[:, :32] = 0
+        stats = compute_image_stats(_encode(image), reduce_factor=1)
+        self.assertAlmostEqual(stats['cloud_fraction'], 0.375, places=2)
+        self.assertAlmostEqual(stats['nodata_fraction'], 0.25, places=2)
+        self.assertEqual(len(stats['band_mean']), 3)
+        self.assertEqual(len(stats['phash']), 16)
+
+    def test_perceptual_hash_is_stable_for_similar_images(self):
+        image = _scene(1)
+        noisy = np.clip(image.astype(np.int16) + 2, 0, 255).astype(np.uint8)
+        a = compute_image_stats(_encode(image))['phash']
+        b = compute_image_stats(_encode(noisy))['phash']
+        c = compute_image_stats(_encode(_scene(2)))['phash']
+        self.assertLessEqual(hamming_distances([a], b)[0], 4)
+        self.assertGreater(hamming_distances([a], c)[0], 4)
+
+    def test_queries_run_on_metadata_only(self):
+        cloudy = _scene(3)
+        cloudy[:48] = 250
+        images = {
+            '2023-01-01': _scene(3),
+            '2023-01-08': _scene(3),
+            '2023-01-15': cloudy,
+            '2023-02-05': _scene(4)
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            for date, image in images.items():
+                record = {"timestamp": date, "section_id": "section_0", "local_path": None, "stats": compute_image_stats(_encode(image))}
+                with open(os.path.join(tmp, f"section_0_{date}.json"), 'w') as f:
+                    json.dump(record, f)
+
+            catalog = ImageryCatalog(tmp)
+            self.assertEqual([r['timestamp'] for r in catalog.cloudy(0.5)], ['2023-01-15'])
+            self.assertNotEqual(catalog.best_per_section_month()[('section_0', '2023-01')]['timestamp'], '2023-01-15')
+            self.assertEqual(catalog.rank()[-1]['timestamp'], '2023-01-15')
+            self.assertEqual([(a['timestamp'], b['timestamp']) for a, b in catalog.duplicates()], [('2023-01-01', '2023-01-08')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.config import settings
+from src.api.job_queue import JobQueue, run_worker
+from src.api.collection_stats import RequestRejected
+from src.models.imagery_data import ImageryData
+
+SECTIONS = [
+    {"id": f"section_{i}", "bounds": {"min_lat": 31.2 + i * 0.1, "max_lat": 31.3 + i * 0.1, "min_lon": 34.2, "max_lon": 34.4}, "center": {"lat": 31.25 + i * 0.1, "lon": 34.3}}
+    for i in range(2)
+]
+DATES = ['2023-01-01', '2023-01-08', '2023-01-15']
+
+class FakeService:
+    def __init__(self, requests_per_fetch=1, delay=0):
+        self.fetched = []
+        self.rate_limiter = None
+        self.requests_per_fetch = requests_per_fetch
+        self.delay = delay
+
+    def fetch_imagery(self, location, date, on_saved=None, on_failed=None):
+        # Each simulated HTTP request (e.g. L2A then the L1C fallback) takes its own token
+        for _ in range(self.requests_per_fetch):
+            self.rate_limiter.wait_for_rate_token()
+        time.sleep(self.delay)
+        self.fetched.append((location["section_id"], date))
+        imagery_data = ImageryData(image_url="", timestamp=date, metadata={}, section_id=location["section_id"], local_path=f"{date}.png")
+        on_saved(imagery_data)
+        return imagery_data
+
+class RejectedService(FakeService):
+    def fetch_imagery(self, location, date, on_saved=None, on_failed=None):
+        raise RequestRejected("Sentinel Hub rejected the request with 403")
+
+class CountingQueue(JobQueue):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tokens_taken = 0
+
+    def wait_for_rate_token(self):
+        self.tokens_taken += 1
+        super().wait_for_rate_token()
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = JobQueue(os.path.join(self.tmp.name, 'jobs.db'), lease_seconds=60, max_attempts=2, rate_per_minute=6000)
+        self.queue.seed(SECTIONS, DATES)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_seed_is_idempotent(self):
+        self.assertEqual(self.queue.seed(SECTIONS, DATES), 0)
+        self.assertEqual(self.queue.stats()['pending'], 6)
+
+    def test_claims_are_exclusive_and_expired_leases_requeue(self):
+        first = self.queue.claim('a')
+        second = self.queue.claim('b')
+        self.assertNotEqual((first['section_id'], first['date']), (second['section_id'], second['date']))
+
+        # Expire worker a's lease: the job goes to worker c and a can no longer complete it
+        self.queue.lease_seconds = -1
+        self.assertTrue(self.queue.heartbeat(first, 'a'))
+        self.queue.lease_seconds = 60
+        reclaimed = self.queue.claim('c')
+        self.assertEqual((reclaimed['section_id'], reclaimed['date']), (first['section_id'], first['date']))
+        self.assertFalse(self.queue.complete(first, 'a'))
+        self.assertTrue(self.queue.complete(reclaimed, 'c'))
+
+    def test_repeatedly_expired_lease_ends_failed(self):
+        queue = JobQueue(os.path.join(self.tmp.name, 'single.db'), lease_seconds=-1, max_attempts=3)
+        queue.seed(SECTIONS[:1], DATES[:1])
+
+        # Each worker "crashes" by letting its lease expire; the next claim counts it as an attempt
+        self.assertEqual(queue.claim('a')['attempts'], 0)
+        self.assertEqual(queue.claim('b')['attempts'], 1)
+        self.assertEqual(queue.claim('c')['attempts'], 2)
+        self.assertIsNone(queue.claim('d'))
+        stats = queue.stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['expired'], 0)
+
+    def test_failed_jobs_retry_until_max_attempts(self):
+        job = self.queue.claim('a')
+        self.queue.fail(job, 'a', 'boom')
+        job = self.queue.claim('a')
+        self.assertEqual(job['attempts'], 1)
+        self.queue.fail(job, 'a', 'boom')
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+    def test_rejected_request_stops_worker_without_using_attempts(self):
+        with self.assertRaises(RequestRejected):
+            run_worker(RejectedService(), self.queue, worker_id="worker-0")
+
+        stats = self.queue.stats()
+        self.assertEqual(stats['pending'], 6)
+        self.assertEqual(stats.get('failed', 0), 0)
+        self.assertEqual(self.queue.claim('worker-1')['attempts'], 0)
+
+    def test_concurrent_workers_fetch_each_job_exactly_once(self):
+        self.queue.seed(SECTIONS, [f"2023-02-{day:02d}" for day in range(1, 11)])
+        services = [FakeService(delay=0.01) for _ in range(4)]
+        # Separate queue objects on the same file, as separate worker processes would have
+        threads = [
+            threading.Thread(target=run_worker, args=(service, JobQueue(self.queue.path, rate_per_minute=60000)), kwargs={"worker_id": f"worker-{i}"})
+            for i, service in enumerate(services)
+        ]
+        with mock.patch.object(settings, "QUEUE_POLL_SECONDS", 0.01):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        fetched = [job for service in services for job in service.fetched]
+        self.assertEqual(len(fetched), 26)
+        self.assertEqual(len(set(fetched)), 26)
+        self.assertGreater(len([service for service in services if service.fetched]), 1)
+        self.assertEqual(self.queue.stats()['done'], 26)
+
+    def test_rate_limit_counts_requests_not_jobs(self):
+        queue = CountingQueue(self.queue.path, rate_per_minute=6000)
+        service = FakeService(requests_per_fetch=2)
+        run_worker(service, queue, worker_id="worker-0")
+        self.assertIs(service.rate_limiter, queue)
+        self.assertEqual(queue.tokens_taken, 12)
+
+    def test_rate_limit_is_shared(self):
+        queue = JobQueue(self.queue.path, rate_per_minute=60)
+        waits = [queue.acquire_rate_token() for _ in range(10)]
+        self.assertEqual(waits[:5], [0] * 5)
+        self.assertGreater(waits[-1], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,304 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from src.config import settings
+from src.processing.scheduler import plan_processing_tasks, process_chunk, ProcessingScheduler, summarize_results, record_results
+from src.processing.timeline import render_timeline
+from src.processing.state import ProcessingState
+from src.processing.compare import plan_comparisons, render_comparison_task
+from src.processing.coregistration import register_images, coregister_sections, load_registrations, _sample
+from src.processing.hotspots import extract_hotspots, update_hotspots, HotspotIndex
+from src.processing.spectral import update_spectral_series, compute_indices, bands_dir
+from src.utils.image_io import list_section_images
+
+def _write_image(path, value):
+    Image.fromarray(np.full((16, 32), value, dtype=np.uint8)).save(path)
+
+class TestProcessingScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.images_dir = os.path.join(self.tmp.name, 'images')
+        self.output_dir = os.path.join(self.tmp.name, 'processed')
+        for section_id in ('section_0', 'section_1'):
+            section_dir = os.path.join(self.images_dir, section_id)
+            os.makedirs(section_dir)
+            for i, date in enumerate(['2023-01-01', '2023-01-08', '2023-01-15']):
+                _write_image(os.path.join(section_dir, f"{date}.png"), 100 if i < 2 else 200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_plan_chunks_carry_previous_image(self):
+        tasks = plan_processing_tasks(self.images_dir, self.output_dir, chunk_size=2)
+        self.assertEqual(len(tasks), 4)
+        self.assertIsNone(tasks[0]['previous_path'])
+        self.assertTrue(tasks[1]['previous_path'].endswith('2023-01-08.png'))
+
+    def test_run_detects_change_across_chunks(self):
+        tasks = plan_processing_tasks(self.images_dir, self.output_dir, chunk_size=2)
+        results, failed = ProcessingScheduler(max_workers=2, max_in_flight=2).run(tasks)
+        summary = summarize_results(results, failed)
+
+        self.assertEqual(failed, [])
+        self.assertEqual(summary['images'], 6)
+        self.assertEqual(summary['sections']['section_0']['max_change_date'], '2023-01-15')
+        self.assertAlmostEqual(summary['sections']['section_0']['max_change'], 1.0)
+
+    def test_incremental_plan_only_touches_new_or_changed_images(self):
+        tasks = plan_processing_tasks(self.images_dir, self.output_dir, chunk_size=2)
+        results, _ = ProcessingScheduler(max_workers=1).run(tasks)
+        record_results(self.output_dir, results)
+        self.assertEqual(plan_processing_tasks(self.images_dir, self.output_dir), [])
+
+        section_dir = os.path.join(self.images_dir, 'section_1')
+        _write_image(os.path.join(section_dir, '2023-01-22.png'), 50)
+        tasks = plan_processing_tasks(self.images_dir, self.output_dir)
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual([date for date, _ in tasks[0]['images']], ['2023-01-22'])
+        self.assertTrue(tasks[0]['previous_path'].endswith('2023-01-15.png'))
+
+        # Rewriting an input invalidates its own output and the next date's diff
+        _write_image(os.path.join(section_dir, '2023-01-08.png'), 90)
+        os.utime(os.path.join(section_dir, '2023-01-08.png'), ns=(1, 1))
+        tasks = plan_processing_tasks(self.images_dir, self.output_dir)
+        self.assertEqual([date for t in tasks for date, _ in t['images']], ['2023-01-08', '2023-01-15', '2023-01-22'])
+
+    def test_failed_task_is_retried_then_reported(self):
+        task = {"section_id": "section_9", "images": [("2023-01-01", "missing.png")], "previous_path": None, "output_dir": self.output_dir}
+        results, failed = ProcessingScheduler(worker=process_chunk, max_workers=1, max_retries=1).run([task])
+        self.assertEqual(results, [])
+        self.assertEqual(len(failed), 1)
+
+class TestCompare(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.images_dir = os.path.join(self.tmp.name, 'images')
+        self.output_dir = os.path.join(self.tmp.name, 'processed')
+        section_dir = os.path.join(self.images_dir, 'section_0')
+        os.makedirs(section_dir)
+        for i, date in enumerate(['2023-01-01', '2023-01-08', '2023-01-15']):
+            _write_image(os.path.join(section_dir, f"{date}.png"), 100 if i < 2 else 200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_baseline_comparisons_decode_baseline_once(self):
+        pairs = plan_comparisons(self.images_dir, '2023-01-02', section_ids=['section_0'])
+        self.assertEqual([(before[0], after[0]) for _, before, after in pairs], [('2023-01-01', '2023-01-08'), ('2023-01-01', '2023-01-15')])
+
+        task = {"section_id": "section_0", "pairs": [(b, a) for _, b, a in pairs], "mode": "swipe", "overlay": True, "output_dir": self.output_dir}
+        result = render_comparison_task(task)
+        self.assertEqual(len(result['outputs']), 2)
+        self.assertGreaterEqual(result['cache']['hits'], 1)
+        with Image.open(result['outputs'][0]) as image:
+            self.assertEqual(image.size, (32, 16))
+
+class TestCoregistration(unittest.TestCase):
+
+    def _scene(self):
+        rng = np.random.default_rng(0)
+        noise = np.fft.rfft2(rng.random((160, 320)))
+        ky = np.fft.fftfreq(160)[:, None]
+        kx = np.fft.rfftfreq(320)[None, :]
+        scene = np.fft.irfft2(noise * np.exp(-(ky ** 2 + kx ** 2) * 40), s=(160, 320))
+        return (scene - scene.min()) / (scene.max() - scene.min()) * 255
+
+    def test_recovers_shifts_and_caches_them_in_metadata(self):
+        scene = self._scene()
+        shifts = {'2023-01-01': (0, 0), '2023-01-08': (3, -2), '2023-01-15': (-4.5, 5.5)}
+        with tempfile.TemporaryDirectory() as tmp:
+            section_dir = os.path.join(tmp, 'images', 'section_0')
+            metadata_dir = os.path.join(tmp, 'metadata')
+            os.makedirs(section_dir)
+            os.makedirs(metadata_dir)
+            for date, (dy, dx) in shifts.items():
+                image = _sample(scene, -dy, -dx, 16, 144, 16, 304)
+                Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(os.path.join(section_dir, f"{date}.png"))
+
+            paths = [os.path.join(section_dir, f"{date}.png") for date in shifts]
+            for (dy, dx), registration in zip(shifts.values(), register_images(paths[0], paths, downsample=1)):
+                self.assertAlmostEqual(registration['dy'], dy, delta=0.5)
+                self.assertAlmostEqual(registration['dx'], dx, delta=0.5)
+
+            results, failed = coregister_sections(os.path.join(tmp, 'images'), metadata_dir, max_workers=1)
+            self.assertEqual(failed, [])
+            registrations = load_registrations(metadata_dir, 'section_0')
+            self.assertEqual(sorted(registrations), sorted(shifts))
+            self.assertEqual(registrations['2023-01-08']['reference'], '2023-01-01')
+
+            # Cached offsets are reused on the next run
+            results, _ = coregister_sections(os.path.join(tmp, 'images'), metadata_dir, max_workers=1)
+            self.assertEqual(results, [])
+
+            tasks = plan_processing_tasks(os.path.join(tmp, 'images'), os.path.join(tmp, 'processed'), metadata_dir=metadata_dir)
+            self.assertIn('2023-01-15', tasks[0]['registrations'])
+
+class TestImageIO(unittest.TestCase):
+
+    def test_dates_stored_under_two_codecs_are_listed_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('2023-01-01.png', '2023-01-01.webp', '2023-01-08.png'):
+                _write_image(os.path.join(tmp, name), 100)
+
+            with mock.patch.object(settings, "IMAGE_STORAGE_CODEC", "webp"):
+                images = list_section_images(tmp)
+            self.assertEqual(images, [('2023-01-01', os.path.join(tmp, '2023-01-01.webp')),
+                                      ('2023-01-08', os.path.join(tmp, '2023-01-08.png'))])
+
+            with mock.patch.object(settings, "IMAGE_STORAGE_CODEC", "original"):
+                images = list_section_images(tmp)
+            self.assertEqual(images[0], ('2023-01-01', os.path.join(tmp, '2023-01-01.png')))
+
+class TestTimeline(unittest.TestCase):
+
+    def test_streamed_animations_are_readable(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, date in enumerate(['2023-01-01', '2023-01-08', '2023-01-15']):
+                _write_image(os.path.join(tmp, f"{date}.png"), 60 * i)
+            images = list_section_images(tmp)
+
+            for fmt in ('gif', 'apng'):
+                output_path = os.path.join(tmp, f"timeline_{fmt}")
+                self.assertEqual(render_timeline(images, output_path, fmt=fmt, width=16), 3)
+                with Image.open(output_path) as animation:
+                    self.assertEqual(animation.n_frames, 3)
+                    self.assertEqual(animation.size, (16, 8))
+
+    def test_frames_of_a_different_size_are_resized(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _write_image(os.path.join(tmp, '2023-01-01.png'), 0)
+            Image.fromarray(np.full((20, 30), 200, dtype=np.uint8)).save(os.path.join(tmp, '2023-01-08.png'))
+            images = list_section_images(tmp)
+
+            for fmt in ('gif', 'apng'):
+                output_path = os.path.join(tmp, f"timeline_{fmt}")
+                self.assertEqual(render_timeline(images, output_path, fmt=fmt, width=64, labels=False), 2)
+                with Image.open(output_path) as animation:
+                    for index in range(animation.n_frames):
+                        animation.seek(index)
+                        self.assertEqual(animation.size, (32, 16))
+
+    def test_failed_render_removes_temporary_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _write_image(os.path.join(tmp, '2023-01-01.png'), 0)
+            images = list_section_images(tmp) + [('2023-01-08', os.path.join(tmp, 'missing.png'))]
+            output_path = os.path.join(tmp, 'timeline.gif')
+
+            with self.assertRaises(FileNotFoundError):
+                render_timeline(images, output_path, fmt='gif')
+            self.assertFalse(os.path.exists(output_path))
+            self.assertFalse(os.path.exists(f"{output_path}.tmp"))
+
+class TestSpectralIndices(unittest.TestCase):
+
+    def test_index_series_is_appended_incrementally(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            images_dir = os.path.join(tmp, 'images')
+            output_dir = os.path.join(tmp, 'processed')
+            section_bands = bands_dir(images_dir, 'section_0')
+            os.makedirs(section_bands)
+
+            def write_bands(date, red, nir):
+                bands = np.zeros((8, 8, 4), dtype=np.uint8)
+                bands[..., 0], bands[..., 1], bands[..., 2], bands[..., 3] = red, nir, 60, 40
+                bands[0] = 0  # No-data row
+                Image.fromarray(bands, 'RGBA').save(os.path.join(section_bands, f"{date}.png"))
+
+            write_bands('2023-01-01', 20, 180)
+            write_bands('2023-01-08', 60, 60)
+            series, failed = update_spectral_series(images_dir, output_dir, max_workers=1)
+            self.assertEqual(failed, [])
+
+            dates, ndvi = series.series('section_0', 'ndvi')
+            self.assertEqual(list(dates), ['2023-01-01', '2023-01-08'])
+            self.assertAlmostEqual(float(ndvi[0]), 0.8, places=5)
+            self.assertAlmostEqual(float(ndvi[1]), 0.0, places=5)
+            _, _, valid = series.query('ndvi', 'valid_fraction')
+            self.assertAlmostEqual(float(valid[0]), 7 / 8)
+
+            # Only the new date is computed on the next run
+            write_bands('2023-01-15', 90, 30)
+            series, _ = update_spectral_series(images_dir, output_dir, max_workers=1)
+            _, dates, ndbi = series.query('ndbi', start='2023-01-15')
+            self.assertEqual(list(dates), ['2023-01-15'])
+            self.assertAlmostEqual(float(ndbi[0]), 1 / 3, places=5)
+            self.assertEqual(len(series), 3)
+            self.assertEqual(update_spectral_series(images_dir, output_dir, max_workers=1)[1], [])
+
+    def test_undefined_pixels_are_nan(self):
+        bands = np.zeros((4, 2, 2), dtype=np.float32)
+        bands[:, 0, 0] = [10, 30, 30, 10]
+        indices = compute_indices(bands)
+        self.assertAlmostEqual(float(indices[0, 0, 0]), 0.5)
+        self.assertTrue(np.isnan(indices[:, 1, 1]).all())
+
+class TestHotspots(unittest.TestCase):
+
+    def test_extract_georeferences_cells(self):
+        mask = np.zeros((64, 128), dtype=bool)
+        mask[:32, 96:] = True   # North-east corner
+        mask[40:44, :8] = True  # Too sparse to count
+        hotspots = extract_hotspots(mask, [34.0, 31.0, 34.4, 31.2], cell_px=32, min_fraction=0.25)
+        self.assertEqual(list(hotspots['cell']), [3])
+        self.assertAlmostEqual(hotspots['min_lon'][0], 34.3)
+        self.assertAlmostEqual(hotspots['max_lon'][0], 34.4)
+        self.assertAlmostEqual(hotspots['min_lat'][0], 31.1)
+        self.assertAlmostEqual(hotspots['max_lat'][0], 31.2)
+        self.assertAlmostEqual(hotspots['magnitude'][0], 1.0)
+        self.assertGreater(hotspots['area_km2'][0], 100)
+
+    def test_index_queries_and_incremental_update(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            processed_dir = os.path.join(tmp, 'processed')
+            metadata_dir = os.path.join(tmp, 'metadata')
+            os.makedirs(metadata_dir)
+            sections = {'section_0': [34.2, 31.2, 34.4, 31.3], 'section_1': [34.2, 31.3, 34.4, 31.4]}
+
+            def add_mask(section_id, date, rows, cols):
+                section_dir = os.path.join(processed_dir, section_id)
+                os.makedirs(section_dir, exist_ok=True)
+                mask = np.zeros((64, 128), dtype=np.uint8)
+                mask[rows, cols] = 255
+                mask_path = os.path.join(section_dir, f"{date}_change.png")
+                Image.fromarray(mask).save(mask_path)
+                with open(os.path.join(metadata_dir, f"{section_id}_{date}.json"), 'w') as f:
+                    json.dump({"bbox": sections[section_id]}, f)
+                state = ProcessingState(processed_dir, section_id)
+                state.record(date, 1, date, None, {"date": date, "change_mask": mask_path})
+                state.save()
+
+            add_mask('section_0', '2023-10-14', slice(0, 32), slice(0, 32))
+            add_mask('section_1', '2023-10-14', slice(32, 64), slice(96, 128))
+            add_mask('section_1', '2023-11-11', slice(32, 64), slice(96, 128))
+            index, failed = update_hotspots(processed_dir, metadata_dir, max_workers=1)
+            self.assertEqual(failed, [])
+            self.assertEqual(len(index), 3)
+
+            north = HotspotIndex(index.path).query(bbox=[34.2, 31.33, 34.4, 31.4])
+            self.assertEqual(set(north['section_id']), {'section_1'})
+            self.assertEqual(len(index.query(start='2023-11-01')['date']), 1)
+
+            top = index.top_k(k=1)
+            self.assertEqual(top[0]['section_id'], 'section_1')
+            self.assertEqual(index.top_k(k=1, section_ids=['section_0'])[0]['section_id'], 'section_0')
+            self.assertEqual(set(index.query(section_ids=['section_1'])['section_id']), {'section_1'})
+            self.assertEqual(top[0]['dates'], 2)
+            self.assertEqual(top[0]['last_date'], '2023-11-11')
+
+            # Only the new mask is extracted on the next run
+            add_mask('section_0', '2023-12-09', slice(0, 64), slice(0, 64))
+            index, _ = update_hotspots(processed_dir, metadata_dir, max_workers=1)
+            self.assertEqual(len(index), 7)
+            self.assertEqual(update_hotspots(processed_dir, metadata_dir, max_workers=1)[1], [])
+            self.assertEqual(index.top_k(k=1, start='2023-12-01')[0]['section_id'], 'section_0')
+
+if __name__ == '__main__':
+    unittest.main()
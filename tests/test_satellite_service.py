@@ -1,6 +1,15 @@
+import os
+import tempfile
 import unittest
+from datetime import datetime
+from unittest import mock
+
+from src.config import settings
+from src.api.collection_stats import RequestRejected
 from src.api.satellite_service import SatelliteService
 
+LOCATION = {"lat": 31.5, "lon": 34.45, "bbox": [34.4, 31.45, 34.5, 31.55], "section_id": "section_0"}
+
 class TestSatelliteService(unittest.TestCase):
 
     def setUp(self):
@@ -21,5 +30,64 @@ class TestSatelliteService(unittest.TestCase):
         self.assertIn('processed_image', processed_data)
         self.assertIn('timestamp', processed_data)
 
+class TestFetchOutcomes(unittest.TestCase):
+    """fetch_imagery against a mocked Processing API"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patches = [
+            mock.patch.object(settings, "DATA_DIR", self.tmp.name),
+            mock.patch.object(settings, "HEDGED_FETCH", False),
+            mock.patch.object(settings, "SPECTRAL_BANDS", False),
+            mock.patch.object(settings, "COLLECTION_EXPLORE_RATE", 0),
+            mock.patch.object(settings, "MIN_BRIGHTNESS", 1)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.responses = []
+        post = mock.patch("src.api.satellite_service.requests.post", side_effect=self._post)
+        post.start()
+        self.addCleanup(post.stop)
+        self.service = SatelliteService()
+
+    def _post(self, url, **kwargs):
+        if url == settings.API_ENDPOINT:
+            return self.responses.pop(0)
+        token = mock.Mock(status_code=200)
+        token.json.return_value = {"access_token": "token", "expires_in": 3600}
+        return token
+
+    def _stats(self):
+        return self.service.collection_stats.counts.get("section_0|2023-01", {})
+
+    def test_rejected_request_stops_and_is_not_counted(self):
+        self.responses = [mock.Mock(status_code=403, text="quota exhausted", content=b"")]
+        with self.assertRaises(RequestRejected):
+            self.service.fetch_imagery(LOCATION, "2023-01-01")
+        self.assertEqual(self._stats(), {})
+        self.assertEqual(self.service.empty_dates.for_section("section_0"), set())
+
+    def test_only_quality_rejections_are_counted(self):
+        self.responses = [mock.Mock(status_code=404, text="not found", content=b""),
+                          mock.Mock(status_code=200, text="", content=b"tiny")]
+        self.assertIsNone(self.service.fetch_imagery(LOCATION, "2023-01-01"))
+        self.assertEqual(self._stats(), {"sentinel-2-l1c": [0, 1]})
+        # One collection failed for another reason, so the date may still have imagery
+        self.assertEqual(self.service.empty_dates.for_section("section_0"), set())
+
+    def test_empty_dates_need_quality_rejections_over_a_past_window(self):
+        tiny = lambda: mock.Mock(status_code=200, text="", content=b"tiny")
+        self.responses = [tiny(), tiny()]
+        self.assertIsNone(self.service.fetch_imagery(LOCATION, "2023-01-01"))
+        self.assertEqual(self.service.empty_dates.for_section("section_0"), {"2023-01-01"})
+
+        # The window of the current week reaches past today, so new acquisitions may still come in
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.responses = [tiny(), tiny()]
+        self.assertIsNone(self.service.fetch_imagery(LOCATION, today))
+        self.assertNotIn(today, self.service.empty_dates.for_section("section_0"))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
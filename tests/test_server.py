@@ -0,0 +1,128 @@
+import io
+import os
+import asyncio
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from src.server import ByteLRUCache, ImageryServer, _parse_range
+
+class FakeWriter:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    def response(self):
+        head, _, body = self.data.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        return int(lines[0].split()[1]), headers, body
+
+class TestByteLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = ByteLRUCache(10)
+        cache.put("a", {"body": b"aaaa"})
+        cache.put("b", {"body": b"bbbb"})
+        cache.get("a")
+        cache.put("c", {"body": b"cccc"})
+
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(cache.size, 8)
+        self.assertIsNone(cache.get("b"))
+
+        # Bodies larger than the whole budget are never cached
+        cache.put("d", {"body": b"d" * 11})
+        self.assertNotIn("d", cache.entries)
+        self.assertEqual(cache.size, 8)
+
+class TestParseRange(unittest.TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(_parse_range("bytes=0-3", 10), (0, 3))
+        self.assertEqual(_parse_range("bytes=4-", 10), (4, 9))
+        self.assertEqual(_parse_range("bytes=-3", 10), (7, 9))
+        self.assertEqual(_parse_range("bytes=5-100", 10), (5, 9))
+        self.assertIsNone(_parse_range("bytes=10-", 10))
+        self.assertIsNone(_parse_range("bytes=6-2", 10))
+        self.assertIsNone(_parse_range("bytes=-", 10))
+        self.assertIsNone(_parse_range("items=0-1", 10))
+
+class TestImageryServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        section_dir = os.path.join(self.tmp.name, 'images', 'section_0')
+        os.makedirs(section_dir)
+        Image.fromarray(np.full((20, 40, 3), 120, dtype=np.uint8)).save(os.path.join(section_dir, '2023-01-01.png'))
+        self.server = ImageryServer(self.tmp.name, cache_bytes=1024 * 1024)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def request(self, target, headers=None):
+        writer = FakeWriter()
+        asyncio.run(self.server.dispatch(writer, "GET", target, headers or {}, keep_alive=False))
+        return writer.response()
+
+    def test_unsatisfiable_range_is_416(self):
+        status, headers, body = self.request("/sections/section_0/2023-01-01", {"range": "bytes=0-9"})
+        self.assertEqual(status, 206)
+        self.assertEqual(len(body), 10)
+
+        length = int(headers["Content-Range"].split("/")[1])
+        status, headers, _ = self.request("/sections/section_0/2023-01-01", {"range": f"bytes={length}-"})
+        self.assertEqual(status, 416)
+        self.assertEqual(headers["Content-Range"], f"bytes */{length}")
+
+    def test_if_none_match_is_weak_and_accepts_lists(self):
+        status, headers, _ = self.request("/sections/section_0/2023-01-01")
+        self.assertEqual(status, 200)
+        etag = headers["ETag"]
+
+        for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            status, _, body = self.request("/sections/section_0/2023-01-01", {"if-none-match": if_none_match})
+            self.assertEqual(status, 304)
+            self.assertEqual(body, b"")
+
+        status, _, _ = self.request("/sections/section_0/2023-01-01", {"if-none-match": '"other"'})
+        self.assertEqual(status, 200)
+
+    def test_oversized_lines_are_rejected(self):
+        async def serve(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            writer = FakeWriter()
+            await self.server.handle(reader, writer)
+            return writer.response()
+
+        long_line = b"x" * 70000
+        status, _, _ = asyncio.run(serve(b"GET /" + long_line + b" HTTP/1.1\r\n\r\n"))
+        self.assertEqual(status, 400)
+        status, _, _ = asyncio.run(serve(b"GET / HTTP/1.1\r\nX-Long: " + long_line + b"\r\n\r\n"))
+        self.assertEqual(status, 431)
+
+    def test_width_downscales_and_rejects_invalid_values(self):
+        status, headers, body = self.request("/sections/section_0/2023-01-01?w=10")
+        self.assertEqual(status, 200)
+        with Image.open(io.BytesIO(body)) as image:
+            self.assertEqual(image.size, (10, 5))
+        self.assertTrue(headers["ETag"].endswith('-10"'))
+
+        for width in ("0", "-5", "wide"):
+            status, _, _ = self.request(f"/sections/section_0/2023-01-01?w={width}")
+            self.assertEqual(status, 400)
+
+if __name__ == '__main__':
+    unittest.main()